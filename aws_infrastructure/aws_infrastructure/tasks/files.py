@@ -0,0 +1,35 @@
+"""
+Helpers for writing files that may be concurrently read.
+"""
+
+import os
+from pathlib import Path
+import threading
+from typing import Union
+
+
+def write_file_atomic(
+    *,
+    path: Union[Path, str],
+    content: str,
+    newline: str = None,
+):
+    """
+    Write a file, so a concurrent reader observes either the prior file or the complete new file.
+
+    The content is written to a temporary file alongside the target, which then replaces the target.
+    Any missing parent directories are created.
+    """
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Temporary name is unique to this process and thread, so concurrent writers do not collide
+    path_temp = path.with_name('{}.{}.{}.tmp'.format(path.name, os.getpid(), threading.get_ident()))
+    try:
+        with open(path_temp, mode='w', newline=newline) as file_temp:
+            file_temp.write(content)
+        os.replace(path_temp, path)
+    finally:
+        if path_temp.exists():
+            path_temp.unlink()
@@ -117,6 +117,7 @@ def create_tasks(
 
     terraform_variables_factory=None,
     terraform_variables_path: Union[Path, str] = None,
+    profile: bool = False,
 ):
     """
     Create all of the tasks, re-using and passing parameters appropriately.
@@ -149,6 +150,7 @@ def create_tasks(
             terraform_dir=terraform_dir,
             config_dir=Path(terraform_dir, name),
         ),
+        profile=profile,
     )
 
     compose_collection(
@@ -6,6 +6,8 @@ import ruamel.yaml
 from typing import List
 from typing import Union
 
+import aws_infrastructure.tasks.library.helm_index
+
 
 def _task_package(
     *,
@@ -25,6 +27,9 @@ def _task_package(
         Build packages from charts into staging.
         """
 
+        # Existing releases, beware there might not be any prior index
+        helm_chart_index = aws_infrastructure.tasks.library.helm_index.HelmChartIndex.load(helm_repo_dir)
+
         # Go through provided helm charts directories
         for dir_helm_charts_current in helm_charts_dirs:
             # Package any chart which has a version that has not already been released
@@ -40,18 +45,7 @@ def _task_package(
                     chart_version = yaml_chart['version']
 
                     # Check existing releases of this same chart
-                    chart_released = False
-                    path_index = Path(helm_repo_dir, 'index.yaml')
-                    # Beware there might not be any prior index
-                    if path_index.exists():
-                        with open(path_index) as file_index:
-                            yaml_index = ruamel.yaml.safe_load(file_index)
-
-                        # Beware the prior index might not include this chart
-                        if chart_name in yaml_index['entries']:
-                            for release_current in yaml_index['entries'][chart_name]:
-                                if release_current['version'] == chart_version:
-                                    chart_released = True
+                    chart_released = helm_chart_index.is_released(chart_name, chart_version)
 
                     # If the current version was not previously released, go ahead with packaging it into staging
                     if not chart_released:
@@ -0,0 +1,111 @@
+"""
+Index of the charts released in a Helm repository, read from the repository's `index.yaml`.
+
+The index is parsed once and cached until the file changes,
+so resolving a chart does not depend on the number of files in the repository.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+import ruamel.yaml
+import semver
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from urllib.parse import urlparse
+
+# Indexes are cached by path, and reloaded only if their file changes
+_index_cache: Dict[Path, Tuple[Tuple[int, int], 'HelmChartIndex']] = {}
+_index_yaml = ruamel.yaml.YAML(typ='safe')
+
+
+@dataclass(frozen=True)
+class HelmChartRelease:
+    name: str
+    version: str
+    path: Optional[Path]  # None if the chart is not stored in the repository (e.g., a remote URL)
+
+
+class HelmChartIndex:
+    """
+    Releases of each chart in a Helm repository.
+    """
+
+    _releases: Dict[str, Dict[str, HelmChartRelease]]
+    _latest: Dict[str, HelmChartRelease]
+
+    def __init__(self, *, helm_repo_dir: Union[Path, str], yaml_index: Optional[Dict]):
+        helm_repo_dir = Path(helm_repo_dir)
+
+        self._releases = {}
+        self._latest = {}
+
+        entries = (yaml_index or {}).get('entries') or {}
+        for chart_name, releases in entries.items():
+            releases_current = {}
+            version_latest = None
+            for release_current in releases or []:
+                version = str(release_current['version'])
+
+                path = None
+                for url_current in release_current.get('urls') or []:
+                    if not urlparse(url_current).scheme:
+                        path = Path(helm_repo_dir, url_current)
+                        break
+
+                release = HelmChartRelease(name=chart_name, version=version, path=path)
+                releases_current[version] = release
+
+                # Versions which are not semver cannot be ordered, so are never the latest
+                try:
+                    version_parsed = semver.VersionInfo.parse(version)
+                except ValueError:
+                    continue
+                if version_latest is None or version_parsed > version_latest:
+                    version_latest = version_parsed
+                    self._latest[chart_name] = release
+
+            self._releases[chart_name] = releases_current
+
+    @staticmethod
+    def load(helm_repo_dir: Union[Path, str]) -> 'HelmChartIndex':
+        """
+        Load the index of a repository, which is empty if the repository has no index.
+        """
+
+        helm_repo_dir = Path(helm_repo_dir)
+        path_index = Path(helm_repo_dir, 'index.yaml').resolve()
+
+        if not path_index.exists():
+            return HelmChartIndex(helm_repo_dir=helm_repo_dir, yaml_index=None)
+
+        stat = path_index.stat()
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+
+        cached = _index_cache.get(path_index)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+        with open(path_index) as file_index:
+            yaml_index = _index_yaml.load(file_index)
+
+        index = HelmChartIndex(helm_repo_dir=helm_repo_dir, yaml_index=yaml_index)
+        _index_cache[path_index] = (stat_key, index)
+
+        return index
+
+    def latest(self, chart_name: str) -> Optional[HelmChartRelease]:
+        """
+        The release of a chart with the greatest version, or None if the chart has no release.
+        """
+        return self._latest.get(chart_name)
+
+    def release(self, chart_name: str, version: str) -> Optional[HelmChartRelease]:
+        """
+        A specific release of a chart, or None if that version has not been released.
+        """
+        return self._releases.get(chart_name, {}).get(str(version))
+
+    def is_released(self, chart_name: str, version: str) -> bool:
+        return self.release(chart_name, version) is not None
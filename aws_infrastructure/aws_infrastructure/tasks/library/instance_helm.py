@@ -1,9 +1,8 @@
 from invoke import task
-import os
 from pathlib import Path
 import re
-import semver
 
+import aws_infrastructure.tasks.library.helm_index
 import aws_infrastructure.tasks.library.instance_ssh
 import aws_infrastructure.tasks.ssh
 
@@ -42,23 +41,12 @@ def task_helm_install(
             helm_chart = Path(helm_repo_dir, '{}.tgz'.format(helm_chart))
         else:
             # A name absent a version (e.g., 'ingress').
-            # Find the latest matching chart in helm_charts_dir.
-            # Current implemented by looking directly at the files in the repo.
-            # Alternatively, could parse and examine `index.yaml`.
-            helm_chart_latest = None
-            helm_chart_version_latest = None
-            for root, dirs, files in os.walk(helm_repo_dir):
-                for file_current in files:
-                    if (match := re.match('(.+)-([0-9\\.]+)\\.tgz', file_current)) is not None:
-                        match_chart = match.group(1)
-                        match_version = semver.VersionInfo.parse(match.group(2))
-                        if match_chart == helm_chart:
-                            if (helm_chart_version_latest is None) or (match_version > helm_chart_version_latest):
-                                helm_chart_latest = Path(root, file_current)
-                                helm_chart_version_latest = match_version
+            # Find the latest release of the chart in the index of helm_charts_dir.
+            helm_chart_index = aws_infrastructure.tasks.library.helm_index.HelmChartIndex.load(helm_repo_dir)
+            helm_chart_latest = helm_chart_index.latest(helm_chart)
 
-            if helm_chart_latest:
-                helm_chart = helm_chart_latest
+            if helm_chart_latest and helm_chart_latest.path:
+                helm_chart = helm_chart_latest.path
 
         # Ensure we now have a path to a specific chart
         if not Path(helm_chart).is_file():
@@ -78,19 +66,17 @@ def task_helm_install(
         # Connect via SSH
         ssh_config = aws_infrastructure.tasks.ssh.SSHConfig.load(ssh_config_path=ssh_config_path)
         with aws_infrastructure.tasks.ssh.SSHClientContextManager(ssh_config=ssh_config) as ssh_client:
-            # Create a staging directory
-            ssh_client.exec_command(command=[
-                'rm -rf {}'.format(staging_remote_dir.as_posix()),
-                'mkdir -p {}'.format(staging_remote_dir.as_posix()),
-            ])
-
-            # Upload the chart file
-            with aws_infrastructure.tasks.ssh.SFTPClientContextManager(ssh_client=ssh_client) as sftp_client:
-                sftp_client.paramiko_sftp_client.chdir(staging_remote_dir.as_posix())
-                sftp_client.paramiko_sftp_client.put(
-                    localpath=Path(helm_chart),
-                    remotepath=helm_chart_file_name,
-                )
+            # Upload the chart file.
+            # The staging directory is retained between installs, so an unchanged chart is not uploaded again.
+            result = aws_infrastructure.tasks.ssh.sftp_sync(
+                ssh_client=ssh_client,
+                remote_dir=staging_remote_dir.as_posix(),
+                files={
+                    helm_chart_file_name: Path(helm_chart),
+                },
+            )
+            if result.skipped:
+                print('Chart already uploaded')
 
             # Install the chart.
             # Skip CRDs to require pattern of installing them separately.
@@ -103,7 +89,4 @@ def task_helm_install(
                 Path(staging_remote_dir, helm_chart_file_name).as_posix(),
             ]))
 
-            # Remove the staging directory
-            ssh_client.exec_command(command='rm -rf {}'.format(staging_remote_dir.as_posix()))
-
     return helm_install
@@ -52,62 +52,56 @@ def _helmfile_apply(
                 'destination': path_staging_values_remote_current,
             })
 
+    # Determine the files to upload, relative to the remote staging directory
+    files = {}
+    for dependency_current in helmfile_config.get('dependencies', []):
+        if 'file' in dependency_current:
+            # Process a file dependency
+            path_local = Path(
+                helmfile_config_path.parent,
+                dependency_current['file']
+            )
+            path_remote = Path(
+                dependency_current['destination']
+            )
+
+            # Ensure the dependency exists
+            if not path_local.is_file():
+                print('Dependency not found at: {}'.format(path_local))
+                return
+
+            files[path_remote.as_posix()] = path_local
+        else:
+            print('Unknown dependency type: {}'.format(dependency_current))
+            return
+
+    print('Uploading helmfile at: {}'.format(helmfile_path))
+    files[helmfile_path.name] = helmfile_path
+
+    # Each helmfile is staged in its own directory, named for the helmfile
+    helmfile_staging_remote_dir = Path(
+        staging_remote_dir,
+        '{}_{}'.format(helmfile_path.resolve().parent.name, helmfile_path.stem),
+    )
+
     # Connect via SSH
     ssh_config = aws_infrastructure.tasks.ssh.SSHConfig.load(ssh_config_path=ssh_config_path)
     with aws_infrastructure.tasks.ssh.SSHClientContextManager(ssh_config=ssh_config) as ssh_client:
-        # Create a remote staging directory
-        ssh_client.exec_command(command=[
-            'rm -rf {}'.format(staging_remote_dir.as_posix()),
-            'mkdir -p {}'.format(staging_remote_dir.as_posix()),
-        ])
-
-        with aws_infrastructure.tasks.ssh.SFTPClientContextManager(ssh_client=ssh_client) as sftp_client:
-            # FTP within the staging directory
-            sftp_client.paramiko_sftp_client.chdir(staging_remote_dir.as_posix())
-
-            # Upload any dependencies in any provided configuration
-            for dependency_current in helmfile_config.get('dependencies', []):
-                if 'file' in dependency_current:
-                    # Process a file dependency
-                    path_local = Path(
-                        helmfile_config_path.parent,
-                        dependency_current['file']
-                    )
-                    path_remote = Path(
-                        dependency_current['destination']
-                    )
-
-                    # Ensure the dependency exists
-                    if not path_local.is_file():
-                        print('Dependency not found at: {}'.format(path_local))
-                        return
-
-                    # Ensure any remote directories exist
-                    if path_remote.parent != Path('.'):
-                        ssh_client.exec_command(command=[
-                            'mkdir -p {}'.format(
-                                Path(
-                                    staging_remote_dir,
-                                    path_remote.parent
-                                ).as_posix()
-                            )
-                        ])
-
-                    # Upload the dependency file
-                    sftp_client.paramiko_sftp_client.put(
-                        localpath=str(path_local),
-                        remotepath=str(path_remote.as_posix()),
-                    )
-                else:
-                    print('Unknown dependency type: {}'.format(dependency_current))
-                    return
-
-            # Upload the helmfile
-            print('Uploading helmfile at: {}'.format(helmfile_path))
-            sftp_client.paramiko_sftp_client.put(
-                localpath=helmfile_path,
-                remotepath=helmfile_path.name,
-            )
+        # Upload into the staging directory.
+        # The staging directory is retained between applies, so unchanged files are not uploaded again.
+        # Any file which is no longer a dependency is removed, so stale files do not remain.
+        result = aws_infrastructure.tasks.ssh.sftp_sync(
+            ssh_client=ssh_client,
+            remote_dir=helmfile_staging_remote_dir.as_posix(),
+            files=files,
+            prune=True,
+        )
+        print('Uploaded {} files ({} bytes), {} unchanged, {} removed'.format(
+            len(result.uploaded),
+            result.bytes_uploaded,
+            len(result.skipped),
+            len(result.removed),
+        ))
 
         # Apply the helmfile
         #
@@ -118,7 +112,7 @@ def _helmfile_apply(
             'helmfile',
             '--file {}'.format(
                 Path(
-                    staging_remote_dir,
+                    helmfile_staging_remote_dir,
                     helmfile_path.name
                 ).as_posix()
             ),
@@ -126,9 +120,6 @@ def _helmfile_apply(
             '--skip-diff-on-install',
         ]))
 
-        # Remove the staging directory
-        ssh_client.exec_command(command='rm -rf {}'.format(staging_remote_dir.as_posix()))
-
 
 def task_helmfile_apply(
     *,
@@ -1,6 +1,8 @@
 from collections import namedtuple
+from invoke import Exit
 from invoke import task
 from pathlib import Path
+from typing import Dict
 from typing import List
 from typing import Union
 
@@ -36,7 +38,7 @@ def task_ssh(
                 'ssh',
                 '-l {}'.format(ssh_config.user),
                 '-i {}'.format(Path(ssh_config_path.parent, ssh_config.key_file)),
-                '-o StrictHostKeyChecking=no',
+                '-o StrictHostKeyChecking=accept-new',  # As with Paramiko, record a new key but reject a changed key
                 '-o UserKnownHostsFile="{}"'.format(Path(ssh_config_path.parent, 'known_hosts')),
                 ssh_config.ip
             ]),
@@ -58,9 +60,9 @@ def task_ssh_port_forward(
     ssh_config_path = Path(ssh_config_path)
 
     @task
-    def ssh_port_forward(context, port, host=None, local_port=None):
+    def ssh_port_forward(context, port, host=None, local_port=None, stats_interval=None, stats_file=None):
         """
-        Forward a port from a remote host.
+        Forward a port from a remote host, optionally printing stats at an interval or writing them on exit.
         """
 
         # Load the SSH config
@@ -88,8 +90,149 @@ def task_ssh_port_forward(
                 ssh_client=ssh_client,
                 local_port=local_port,
                 remote_host=remote_host,
-                remote_port=remote_port
+                remote_port=remote_port,
+                stats_interval=float(stats_interval) if stats_interval else None,
+                stats_path=stats_file,
             ) as port_forward:
                 port_forward.serve_forever()
 
     return ssh_port_forward
+
+
+def task_ssh_port_forwards(
+    *,
+    config_key: str,
+    ssh_config_path: Union[Path, str],
+):
+    """
+    Create a task to forward many ports from remote hosts over a single connection.
+    """
+
+    ssh_config_path = Path(ssh_config_path)
+
+    @task(iterable=['forward'])
+    def ssh_port_forwards(context, forward, stats_interval=None, stats_file=None):
+        """
+        Forward ports from remote hosts, each of the form '[[local_port:]host:]port'.
+
+        Optionally prints stats at an interval or writes them on exit.
+        """
+
+        if not forward:
+            raise Exit('No port forward provided.', code=1)
+
+        try:
+            specs = [
+                aws_infrastructure.tasks.ssh.SSHPortForwardSpec.parse(forward_current)
+                for forward_current in forward
+            ]
+        except ValueError as error:
+            raise Exit(str(error), code=1)
+
+        # Load the SSH config
+        ssh_config = aws_infrastructure.tasks.ssh.SSHConfig.load(ssh_config_path=ssh_config_path)
+
+        # Connect via SSH, every forward shares the connection
+        with aws_infrastructure.tasks.ssh.SSHClientContextManager(ssh_config=ssh_config) as ssh_client:
+            with aws_infrastructure.tasks.ssh.SSHMultiPortForwardContextManager(
+                ssh_client=ssh_client,
+                specs=specs,
+                stats_interval=float(stats_interval) if stats_interval else None,
+                stats_path=stats_file,
+            ) as port_forwards:
+                try:
+                    port_forwards.serve_forever()
+                finally:
+                    for local_port_current, spec_current, counters_current in zip(
+                        port_forwards.local_ports,
+                        port_forwards.specs,
+                        port_forwards.counters,
+                    ):
+                        print('{} to {}:{}: {} connections ({} failed), {} bytes sent, {} bytes received'.format(
+                            local_port_current,
+                            spec_current.remote_host,
+                            spec_current.remote_port,
+                            counters_current.connections,
+                            counters_current.connections_failed,
+                            counters_current.bytes_sent,
+                            counters_current.bytes_received,
+                        ))
+
+    return ssh_port_forwards
+
+
+def task_ssh_exec(
+    *,
+    config_key: str,
+    ssh_config_paths: Dict[str, Union[Path, str]],  # Each instance name maps to its SSH config
+    max_workers: int = 8,
+):
+    """
+    Create a task to execute a command on every instance concurrently.
+    """
+
+    ssh_config_paths = {
+        instance_name_current: Path(ssh_config_path_current)
+        for instance_name_current, ssh_config_path_current in ssh_config_paths.items()
+    }
+
+    @task(iterable=['command', 'instance'])
+    def ssh_exec(context, command, instance=None):
+        """
+        Execute commands on every instance, or only on any provided instances.
+        """
+
+        if not command:
+            raise Exit('No command provided.', code=1)
+
+        instance_names = instance or list(ssh_config_paths.keys())
+        for instance_name_current in instance_names:
+            if instance_name_current not in ssh_config_paths:
+                raise Exit('Unknown instance: {}'.format(instance_name_current), code=1)
+
+        print('Command')
+        for command_current in command:
+            print('  ' + command_current)
+
+        # Load the SSH configs
+        ssh_configs = {
+            instance_name_current: aws_infrastructure.tasks.ssh.SSHConfig.load(
+                ssh_config_path=ssh_config_paths[instance_name_current]
+            )
+            for instance_name_current in instance_names
+        }
+
+        results = aws_infrastructure.tasks.ssh.exec_command_fanout(
+            ssh_configs=ssh_configs,
+            command=list(command),
+            max_workers=max_workers,
+        )
+
+        failed = []
+        for instance_name_current, result_current in results.items():
+            if isinstance(result_current, Exception):
+                print('Instance {}: failed ({})'.format(instance_name_current, result_current))
+                failed.append(instance_name_current)
+                continue
+
+            print('Instance {}: exit status {} in {:.1f}s'.format(
+                instance_name_current,
+                result_current.exit_status,
+                result_current.duration,
+            ))
+            if result_current.stdout:
+                print('Output')
+                for line_current in result_current.stdout.splitlines():
+                    print('  ' + line_current.rstrip())
+            if result_current.stderr:
+                print('Error')
+                for line_current in result_current.stderr.splitlines():
+                    print('  ' + line_current.rstrip())
+
+            if result_current.exit_status != 0:
+                failed.append(instance_name_current)
+
+        if failed:
+            raise Exit('Command failed on: {}'.format(', '.join(failed)), code=1)
+
+    return ssh_exec
@@ -1,4 +1,5 @@
 from aws_infrastructure.tasks.collection import compose_collection
+import aws_infrastructure.tasks.library.instance_ssh
 import aws_infrastructure.tasks.library.terraform
 import aws_infrastructure.tasks.library.minikube_instance
 from invoke import Collection
@@ -70,6 +71,9 @@ def create_tasks(
 
     terraform_variables_factory = None,
     terraform_variables_path: Union[Path, str] = None,
+    targeted_tasks: bool = False,
+    profile: bool = False,
+    state_report: bool = False,
 ):
     """
     Create all of the tasks, re-using and passing parameters appropriately.
@@ -97,6 +101,9 @@ def create_tasks(
             terraform_dir=terraform_dir,
             instance_names=instance_names,
         ),
+        targeted_tasks=targeted_tasks,
+        profile=profile,
+        state_report=state_report,
     )
 
     # Compose the top-level Terraform tasks
@@ -107,6 +114,7 @@ def create_tasks(
     )
 
     # Then create tasks associated with any active instances
+    ssh_config_paths = {}
     for instance_name_current in instance_names:
         # Instance dirs are relative to the Terraform directory
         dir_instance_current = Path(terraform_dir, instance_name_current)
@@ -114,6 +122,8 @@ def create_tasks(
 
         # We are currently using existence of the ssh_config to detect the instance exists
         if ssh_config_path.exists():
+            ssh_config_paths[instance_name_current] = ssh_config_path
+
             # Create the instance tasks
             ns_instance = aws_infrastructure.tasks.library.minikube_instance.create_tasks(
                 config_key='{}.{}'.format(config_key, instance_name_current),
@@ -135,4 +145,11 @@ def create_tasks(
                 sub=len(instance_names) > 1
             )
 
+    # With multiple instances, a command can also be executed on all of them at once
+    if len(ssh_config_paths) > 1:
+        ns.add_task(aws_infrastructure.tasks.library.instance_ssh.task_ssh_exec(
+            config_key=config_key,
+            ssh_config_paths=ssh_config_paths,
+        ))
+
     return ns
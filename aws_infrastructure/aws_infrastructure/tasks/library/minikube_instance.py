@@ -60,6 +60,12 @@ def create_tasks(
     )
     ns.add_task(ssh_port_forward)
 
+    ssh_port_forwards = aws_infrastructure.tasks.library.instance_ssh.task_ssh_port_forwards(
+        config_key=config_key,
+        ssh_config_path=ssh_config_path,
+    )
+    ns.add_task(ssh_port_forwards)
+
     helm_install = aws_infrastructure.tasks.library.instance_helm.task_helm_install(
         config_key=config_key,
         helm_repo_dir=helm_repo_dir,
@@ -1,10 +1,23 @@
+import aws_infrastructure.tasks.files
+import aws_infrastructure.tasks.library.terraform_profile
+import aws_infrastructure.tasks.library.terraform_runner
 from collections import namedtuple
+import concurrent.futures
+import contextlib
+import hashlib
 from invoke import Collection
+from invoke import Context
+from invoke import Exit
 from invoke import task
+from invoke import UnexpectedExit
 import json
 import os
 from pathlib import Path
+import re
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
 from typing import Union
 
 
@@ -12,57 +25,664 @@ def _write_terraform_variables(
     *,
     terraform_variables_path: Path,
     terraform_variables_dict,
-):
-    with open(terraform_variables_path, 'w') as file_variables:
-        file_variables.write('\n'.join(
+) -> bool:
+    """
+    Write variables for Terraform, returning whether the file changed.
+
+    A path ending in '.tfvars.json' is written as JSON, otherwise as HCL.
+    An unchanged file is left untouched, so its modification time is preserved.
+    """
+
+    if terraform_variables_path.name.endswith('.tfvars.json'):
+        # JSON variable files do not allow comments
+        content = json.dumps(terraform_variables_dict, indent=2) + '\n'
+    else:
+        content = '\n'.join(
             [
                 '################################################################################',
                 '# This file is automatically generated. Changes will be overwritten.',
                 '################################################################################',
                 '',
             ]
-        ))
+        )
         for key, value in terraform_variables_dict.items():
-            file_variables.write(
-                '{} = {}\n'.format(
-                    key,
-                    json.dumps(value, separators=(',', ' = ')),
-                )
+            content += '{} = {}\n'.format(
+                key,
+                json.dumps(value, separators=(',', ' = ')),
             )
 
+    # Compare against any existing file
+    sha256_content = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    if terraform_variables_path.exists():
+        with open(terraform_variables_path, mode='rb') as file_variables:
+            sha256_existing = hashlib.sha256(file_variables.read()).hexdigest()
+
+        if sha256_existing == sha256_content:
+            return False
+
+    # Terraform never observes a partial file
+    aws_infrastructure.tasks.files.write_file_atomic(
+        path=terraform_variables_path,
+        content=content,
+        newline='\n',
+    )
+
+    return True
+
+
+def read_json_cache(
+    *,
+    path_cache: Path,
+) -> Optional[Dict]:
+    """
+    Read a cache file, or None if it is missing or cannot be parsed.
+    """
+
+    if not path_cache.exists():
+        return None
+
+    try:
+        with open(path_cache, mode='r') as file_cache:
+            return json.load(file_cache)
+    except (OSError, ValueError):
+        # A corrupt cache is treated as a miss and will be replaced
+        return None
+
+
+def write_json_cache(
+    *,
+    path_cache: Path,
+    json_cache: Dict,
+):
+    """
+    Write a cache file.
+    """
+
+    # A concurrent reader never observes a partial cache
+    aws_infrastructure.tasks.files.write_file_atomic(
+        path=path_cache,
+        content=json.dumps(json_cache),
+    )
+
+
+def outputs_from_state(
+    *,
+    json_state: Dict,
+) -> Optional[Dict]:
+    """
+    Extract outputs from a state, in the same structure as `terraform output -json`.
+
+    Returns None if the state version is not understood.
+    """
+
+    # Only version 4 is understood, which Terraform has used since 0.12
+    if json_state.get('version') != 4:
+        return None
+
+    return {
+        name_current: {
+            'sensitive': output_current.get('sensitive', False),
+            'type': output_current.get('type'),
+            'value': output_current.get('value'),
+        }
+        for name_current, output_current in json_state.get('outputs', {}).items()
+    }
+
+
+def read_workspace(
+    *,
+    terraform_dir: Path,
+) -> str:
+    """
+    Determine the selected workspace, resolved as Terraform resolves it.
+
+    A workspace may be selected by the environment, which takes precedence, or by a prior 'terraform workspace select'.
+    """
+
+    workspace = os.environ.get('TF_WORKSPACE')
+    if not workspace:
+        path_environment = Path(terraform_dir, '.terraform', 'environment')
+        if path_environment.exists():
+            workspace = path_environment.read_text().strip()
+
+    return workspace or 'default'
+
+
+def _local_state_authoritative(
+    *,
+    terraform_dir: Path,
+) -> bool:
+    """
+    Determine whether the local state file is the authoritative state.
+
+    A backend other than local means a local state file is not authoritative (e.g., left behind by a migration).
+    Nor is it with a workspace other than default selected, as that state is stored in terraform.tfstate.d.
+    """
+
+    path_backend = Path(terraform_dir, '.terraform', 'terraform.tfstate')
+    if path_backend.exists():
+        with open(path_backend, mode='r') as file_backend:
+            json_backend = json.load(file_backend)
+        if json_backend.get('backend', {}).get('type', 'local') != 'local':
+            return False
+
+    if read_workspace(terraform_dir=terraform_dir) != 'default':
+        return False
+
+    return True
+
+
+def _init_fingerprint(
+    *,
+    terraform_dir: Path,
+) -> Dict:
+    """
+    Fingerprint everything that determines the result of an init.
+
+    Includes the dependency lock file, the Terraform configuration files,
+    and the configuration files of any modules recorded by a prior init.
+    """
+
+    def _sha256_files(paths: List[Path]) -> Dict[str, str]:
+        sha256_files = {}
+        for path_current in sorted(paths):
+            with open(path_current, mode='rb') as file_current:
+                path_key = Path(os.path.relpath(path_current, terraform_dir)).as_posix()
+                sha256_files[path_key] = hashlib.sha256(file_current.read()).hexdigest()
+
+        return sha256_files
+
+    def _configuration_paths(dir_current: Path) -> List[Path]:
+        return [
+            path_current
+            for pattern_current in ['*.tf', '*.tf.json']
+            for path_current in dir_current.glob(pattern_current)
+            if path_current.is_file()
+        ]
+
+    fingerprint = {}
+
+    # The dependency lock file
+    path_lock = Path(terraform_dir, '.terraform.lock.hcl')
+    fingerprint['lock'] = _sha256_files([path_lock] if path_lock.exists() else [])
+
+    # The configuration itself
+    fingerprint['configuration'] = _sha256_files(_configuration_paths(terraform_dir))
+
+    # Any modules, as recorded by Terraform during init
+    fingerprint['modules'] = {}
+    path_modules = Path(terraform_dir, '.terraform', 'modules', 'modules.json')
+    if path_modules.exists():
+        with open(path_modules, mode='r') as file_modules:
+            json_modules = json.load(file_modules)
+
+        for module_current in json_modules.get('Modules', []):
+            # The root module has an empty key and is already included
+            if not module_current.get('Key'):
+                continue
+
+            dir_module_current = Path(terraform_dir, module_current['Dir'])
+            fingerprint['modules'][module_current['Key']] = {
+                'source': module_current.get('Source'),
+                'files': _sha256_files(_configuration_paths(dir_module_current)) if dir_module_current.is_dir() else {},
+            }
+
+    return fingerprint
+
+
+def _init_fingerprint_path(
+    *,
+    terraform_dir: Path,
+) -> Path:
+    """
+    Path of the fingerprint recorded by the last successful init.
+    """
+
+    return Path(terraform_dir, '.terraform', 'init.fingerprint.json')
+
+
+@contextlib.contextmanager
+def _plugin_cache_lock(
+    *,
+    plugin_cache_dir: Path,
+):
+    """
+    Hold an exclusive lock on a shared plugin cache.
+
+    Terraform does not guarantee that concurrent inits can safely share a plugin cache,
+    so inits sharing a cache are serialized, including across processes.
+    """
+
+    plugin_cache_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(Path(plugin_cache_dir, '.lock'), mode='a+b') as file_lock:
+        if os.name == 'nt':
+            import msvcrt
+
+            file_lock.seek(0)
+            # LK_LOCK retries for several seconds before failing, so loop until obtained
+            while True:
+                try:
+                    msvcrt.locking(file_lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+            try:
+                yield
+            finally:
+                file_lock.seek(0)
+                msvcrt.locking(file_lock.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file_lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file_lock.fileno(), fcntl.LOCK_UN)
+
+
+def _cli_config_path(
+    *,
+    env: Dict[str, str],
+) -> Optional[Path]:
+    """
+    Path of the Terraform CLI configuration that would otherwise apply, or None if there is none.
+    """
+
+    path_env = env.get('TF_CLI_CONFIG_FILE') or os.environ.get('TF_CLI_CONFIG_FILE')
+    if path_env:
+        path_config = Path(path_env)
+    elif os.name == 'nt':
+        path_config = Path(os.environ.get('APPDATA', ''), 'terraform.rc')
+    else:
+        path_config = Path(Path.home(), '.terraformrc')
+
+    return path_config if path_config.is_file() else None
+
+
+def _provider_mirror_config(
+    *,
+    terraform_dir: Path,
+    provider_mirror_dir: Path,
+    cli_config_path: Optional[Path] = None,
+) -> Optional[Path]:
+    """
+    Write a Terraform CLI configuration which installs mirrored providers from the mirror.
+
+    Providers absent from the mirror continue to be installed directly,
+    so a stack can be initialized before its providers have been mirrored.
+    Returns None if the mirror does not yet contain any providers.
+
+    Because the written configuration replaces any existing CLI configuration (e.g., ~/.terraformrc),
+    the existing configuration at cli_config_path is included in it, so settings such as credentials still apply.
+    An existing configuration which already configures provider installation, or which is in JSON, cannot be combined,
+    so returns None and the existing configuration applies without the mirror.
+    """
+
+    path_config = Path(terraform_dir, '.terraform', 'provider_mirror.generated.tfrc')
+
+    config_existing = ''
+    if cli_config_path is not None and cli_config_path.resolve() != path_config.resolve():
+        if cli_config_path.name.endswith('.json'):
+            print('Not using provider mirror, existing CLI configuration is JSON: {}'.format(cli_config_path))
+            return None
+
+        config_existing = cli_config_path.read_text()
+        if re.search('^\\s*provider_installation\\b', config_existing, flags=re.MULTILINE):
+            print('Not using provider mirror, existing CLI configuration configures provider installation: {}'.format(
+                cli_config_path,
+            ))
+            return None
+
+    # Mirrored providers are in directories of the form HOSTNAME/NAMESPACE/TYPE
+    providers_mirrored = sorted(
+        '/'.join(path_current.relative_to(provider_mirror_dir).parts)
+        for path_current in provider_mirror_dir.glob('*/*/*')
+        if path_current.is_dir()
+    ) if provider_mirror_dir.is_dir() else []
+    if not providers_mirrored:
+        return None
+
+    providers_hcl = ', '.join('"{}"'.format(provider_current) for provider_current in providers_mirrored)
+
+    path_config.parent.mkdir(parents=True, exist_ok=True)
+    with open(path_config, mode='w') as file_config:
+        file_config.write('\n'.join([
+            '################################################################################',
+            '# This file is automatically generated. Changes will be overwritten.',
+            '################################################################################',
+        ] + ([
+            '# Included from: {}'.format(cli_config_path),
+            config_existing.rstrip('\n'),
+            '',
+        ] if config_existing else []) + [
+            'provider_installation {',
+            '  filesystem_mirror {',
+            '    path = "{}"'.format(provider_mirror_dir.resolve().as_posix()),
+            '    include = [{}]'.format(providers_hcl),
+            '  }',
+            '  direct {',
+            '    exclude = [{}]'.format(providers_hcl),
+            '  }',
+            '}',
+            '',
+        ]))
+
+    return path_config
+
+
 def _task_init(
     *,
     config_key: str,
     terraform_bin: Path,
     terraform_dir: Path,
+    init_incremental: bool = False,
+    plugin_cache_dir: Optional[Path] = None,
+    provider_mirror_dir: Optional[Path] = None,
 ):
     """
     Create a task to initialize Terraform and update any dependencies.
+
+    If init_incremental, the init is skipped when nothing has changed since the last successful init.
+    If plugin_cache_dir, providers are cached in that directory and shared with other stacks.
+    If provider_mirror_dir, any providers in that mirror are installed from it rather than downloaded.
+    The mirror is configured through TF_CLI_CONFIG_FILE, in a configuration that includes any existing
+    CLI configuration (from TF_CLI_CONFIG_FILE or the default location). If the existing configuration
+    already configures provider installation, it is left in effect and the mirror is not used.
     """
 
     @task
-    def init(context):
+    def init(context, force=False):
         """
         Initialize Terraform and update any dependencies.
         """
 
+        path_fingerprint = _init_fingerprint_path(terraform_dir=terraform_dir)
+
+        if init_incremental and not force:
+            if path_fingerprint.exists():
+                with open(path_fingerprint, mode='r') as file_fingerprint:
+                    fingerprint_prior = json.load(file_fingerprint)
+
+                if fingerprint_prior == _init_fingerprint(terraform_dir=terraform_dir):
+                    print('Terraform initialized, no changes since prior init')
+                    return
+
+        # Environment for provider installation, combined with any configured environment
+        env = dict(context.config.run.env or {})
+        if provider_mirror_dir:
+            path_mirror_config = _provider_mirror_config(
+                terraform_dir=terraform_dir,
+                provider_mirror_dir=provider_mirror_dir,
+                cli_config_path=_cli_config_path(env=env),
+            )
+            if path_mirror_config:
+                env['TF_CLI_CONFIG_FILE'] = str(path_mirror_config.resolve())
+        if plugin_cache_dir:
+            env['TF_PLUGIN_CACHE_DIR'] = str(plugin_cache_dir.resolve())
+
+        with contextlib.ExitStack() as exit_stack:
+            if plugin_cache_dir:
+                exit_stack.enter_context(_plugin_cache_lock(plugin_cache_dir=plugin_cache_dir))
+
+            with context.cd(terraform_dir):
+                print('Terraform initializing')
+                context.run(
+                    command=' '.join([
+                        os.path.relpath(terraform_bin, terraform_dir),
+                        'init',
+                    ]),
+                    env=env,
+                )
+                context.run(
+                    command=' '.join([
+                        os.path.relpath(terraform_bin, terraform_dir),
+                        'get',
+                        '-update',
+                    ]),
+                    env=env,
+                )
+
+        if init_incremental:
+            # Fingerprint after init, which may have updated the lock file and modules
+            with open(path_fingerprint, mode='w') as file_fingerprint:
+                json.dump(_init_fingerprint(terraform_dir=terraform_dir), file_fingerprint)
+
+    return init
+
+
+def _task_providers_mirror(
+    *,
+    config_key: str,
+    terraform_bin: Path,
+    terraform_dir: Path,
+    provider_mirror_dir: Path,
+):
+    """
+    Create a task to copy the providers required by Terraform into a local mirror.
+    """
+
+    @task(iterable=['platform'])
+    def providers_mirror(context, platform=None):
+        """
+        Copy required providers into the local mirror, for the current platform or any provided platforms.
+        """
+
+        provider_mirror_dir.mkdir(parents=True, exist_ok=True)
+
         with context.cd(terraform_dir):
-            print('Terraform initializing')
+            print('Terraform mirroring providers')
+            # Modules must be available to determine their providers,
+            # but a full init could itself depend upon the mirror being filled
             context.run(
                 command=' '.join([
                     os.path.relpath(terraform_bin, terraform_dir),
-                    'init',
+                    'get',
                 ]),
             )
             context.run(
+                command=' '.join(filter(None, [
+                    os.path.relpath(terraform_bin, terraform_dir),
+                    'providers',
+                    'mirror',
+                    ' '.join('-platform={}'.format(platform_current) for platform_current in platform or []),
+                    '"{}"'.format(provider_mirror_dir.resolve()),
+                ])),
+            )
+
+    return providers_mirror
+
+
+def _target_args(
+    *,
+    targets: Optional[List[str]],
+) -> Optional[str]:
+    """
+    Format any targets as arguments, escaping quotes within addresses (e.g., 'module.x["key"]').
+    """
+
+    if not targets:
+        return None
+
+    return ' '.join(
+        '-target="{}"'.format(target_current.replace('"', '\\"'))
+        for target_current in targets
+    )
+
+
+def _plan_path(
+    *,
+    terraform_dir: Path,
+) -> Path:
+    """
+    Path of the plan saved by an apply in plan mode.
+    """
+
+    return Path(terraform_dir, '.terraform', 'apply.tfplan')
+
+
+def _plan_summary(
+    *,
+    context,
+    terraform_bin: Path,
+    terraform_dir: Path,
+    plan_path: Optional[Path],
+):
+    """
+    Summarize a saved plan, or summarize an empty plan if plan_path is None.
+    """
+
+    resource_changes = {}
+    if plan_path is not None:
+        with context.cd(terraform_dir):
+            result = context.run(
                 command=' '.join([
                     os.path.relpath(terraform_bin, terraform_dir),
-                    'get',
-                    '-update',
+                    'show',
+                    '-json',
+                    '"{}"'.format(os.path.relpath(plan_path, terraform_dir)),
                 ]),
+                hide=True,
             )
 
-    return init
+        json_plan = json.loads(result.stdout.strip())
+        for resource_change_current in json_plan.get('resource_changes', []):
+            actions_current = resource_change_current['change']['actions']
+            if actions_current not in [['no-op'], ['read']]:
+                resource_changes[resource_change_current['address']] = actions_current
+
+    # Count as Terraform does, where a replacement is both an add and a destroy
+    return namedtuple(
+        'plan',
+        [
+            'changes',
+            'add',
+            'change',
+            'destroy',
+            'resource_changes',
+        ]
+    )(
+        changes=plan_path is not None,
+        add=len([actions for actions in resource_changes.values() if 'create' in actions]),
+        change=len([actions for actions in resource_changes.values() if 'update' in actions]),
+        destroy=len([actions for actions in resource_changes.values() if 'delete' in actions]),
+        resource_changes=resource_changes,
+    )
+
+
+def _auto_approved(
+    *,
+    context,
+    auto_approve: bool,
+    operation: str,
+) -> bool:
+    """
+    Determine whether Terraform would proceed with an operation without asking for approval.
+
+    In addition to an explicit auto_approve, approval may have been provided through the environment
+    (e.g., by the stacks tasks, which obtain approval once for all stacks).
+    """
+
+    if auto_approve:
+        return True
+
+    env = context.config.run.env or {}
+    return '-auto-approve' in env.get('TF_CLI_ARGS_{}'.format(operation), os.environ.get('TF_CLI_ARGS_{}'.format(operation), ''))
+
+
+def _profile_history_path(
+    *,
+    terraform_dir: Path,
+) -> Path:
+    """
+    Path of the history of profiled runs.
+    """
+
+    return Path(terraform_dir, '.terraform', 'profile_history.jsonl')
+
+
+def _profile_run(
+    *,
+    history_path: Path,
+    operation: str,
+    run: aws_infrastructure.tasks.library.terraform_runner.TerraformRunResult,
+):
+    """
+    Report the slowest resources in a run, then add the run to the history.
+    """
+
+    aws_infrastructure.tasks.library.terraform_profile.print_report(
+        history_path=history_path,
+        operation=operation,
+        run=run,
+    )
+    aws_infrastructure.tasks.library.terraform_profile.record_run(
+        history_path=history_path,
+        operation=operation,
+        run=run,
+    )
+
+
+def _run_terraform(
+    *,
+    context,
+    terraform_bin: Path,
+    terraform_dir: Path,
+    subcommand: str,
+    args: List[Optional[str]],
+    json_runner: bool,
+    allowed_exit_codes: List[int] = None,
+    echo: bool = False,
+    profile_history_path: Path = None,
+) -> Tuple[int, Optional[aws_infrastructure.tasks.library.terraform_runner.TerraformRunResult]]:
+    """
+    Run a Terraform command, returning its exit code and any result from the JSON runner.
+
+    Any None in args is omitted.
+
+    If profile_history_path, the JSON runner's timings are reported and recorded, including for a failed run.
+    """
+
+    allowed_exit_codes = allowed_exit_codes or [0]
+
+    # Flags must precede any positional arguments, so -json immediately follows the subcommand
+    command = ' '.join(filter(None, [
+        os.path.relpath(terraform_bin, terraform_dir),
+        subcommand,
+        '-json' if json_runner else None,
+    ] + args))
+
+    if json_runner:
+        try:
+            result = aws_infrastructure.tasks.library.terraform_runner.run_terraform_json(
+                context=context,
+                command=command,
+                terraform_dir=terraform_dir,
+                allowed_exit_codes=allowed_exit_codes,
+                echo=echo,
+            )
+        except aws_infrastructure.tasks.library.terraform_runner.TerraformError as error:
+            if profile_history_path:
+                _profile_run(history_path=profile_history_path, operation=subcommand, run=error.result)
+            raise
+
+        if profile_history_path:
+            _profile_run(history_path=profile_history_path, operation=subcommand, run=result)
+
+        return result.exit_code, result
+
+    with context.cd(terraform_dir):
+        result = context.run(
+            command=command,
+            echo=echo,
+            warn=allowed_exit_codes != [0],
+        )
+
+    if result.exited not in allowed_exit_codes:
+        raise UnexpectedExit(result)
+
+    return result.exited, None
 
 
 def _task_apply(
@@ -78,9 +698,24 @@ def _task_apply(
     post_invoke: List[task],
     pre_exec,  # A function to execute before
     post_exec, # A function to execute after
+    apply_plan: bool = False,
+    targets: List[str] = None,
+    json_runner: bool = False,
+    profile_history_path: Path = None,
 ):
     """
     Create a task to issue a Terraform apply.
+
+    If targets, the apply is limited to those resource addresses.
+
+    If apply_plan, a plan is first saved and the apply is skipped if it contains no changes.
+    Otherwise the saved plan is applied, so Terraform does not compute it a second time.
+
+    If json_runner, Terraform is run with machine-readable output and the result is provided to post_exec.
+    Terraform cannot then prompt for approval, so an apply that is not approved in advance uses a saved plan.
+
+    If profile_history_path, the json_runner must also be used, and the timing of each resource is reported and recorded.
+    A plan is profiled separately from the apply, as it includes the refresh.
     """
 
     pre_invoke_combined = [init]
@@ -96,9 +731,10 @@ def _task_apply(
         """
 
         terraform_variables_dict = {}
+        terraform_variables_changed = False
         if terraform_variables_factory:
             terraform_variables_dict = terraform_variables_factory(context=context)
-            _write_terraform_variables(
+            terraform_variables_changed = _write_terraform_variables(
                 terraform_variables_path=terraform_variables_path,
                 terraform_variables_dict=terraform_variables_dict,
             )
@@ -108,24 +744,92 @@ def _task_apply(
                 'apply_pre_exec',
                 [
                     'terraform_variables',
+                    'terraform_variables_changed',
                 ]
             )(
-                terraform_variables=terraform_variables_dict
+                terraform_variables=terraform_variables_dict,
+                terraform_variables_changed=terraform_variables_changed,
             )
             pre_exec(context=context, params=params)
 
-        with context.cd(terraform_dir):
+        plan = None
+        run = None
+        if apply_plan or (json_runner and not _auto_approved(context=context, auto_approve=auto_approve, operation='apply')):
+            plan_path = _plan_path(terraform_dir=terraform_dir)
+
+            try:
+                print('Terraform planning')
+                exit_code, _ = _run_terraform(
+                    context=context,
+                    terraform_bin=terraform_bin,
+                    terraform_dir=terraform_dir,
+                    subcommand='plan',
+                    args=[
+                        '-detailed-exitcode',
+                        '-out="{}"'.format(os.path.relpath(plan_path, terraform_dir)),
+                        '-var-file="{}"'.format(
+                            os.path.relpath(terraform_variables_path, terraform_dir)
+                        ) if terraform_variables_factory else None,
+                        _target_args(targets=targets),
+                    ],
+                    json_runner=json_runner,
+                    # Exit code 2 indicates a plan with changes
+                    allowed_exit_codes=[0, 2],
+                    echo=True,
+                    # Refresh happens during the plan, so must be profiled here
+                    profile_history_path=profile_history_path,
+                )
+
+                plan = _plan_summary(
+                    context=context,
+                    terraform_bin=terraform_bin,
+                    terraform_dir=terraform_dir,
+                    plan_path=plan_path if exit_code == 2 else None,
+                )
+
+                if not plan.changes:
+                    print('Terraform plan has no changes, skipping apply')
+                else:
+                    # A saved plan is applied without prompting, so any approval must be obtained here
+                    if not _auto_approved(context=context, auto_approve=auto_approve, operation='apply'):
+                        response = input('Do you want to perform these actions? Only \'yes\' will be accepted: ')
+                        if response.strip() != 'yes':
+                            raise Exit('Apply cancelled.', code=1)
+
+                    print('Terraform applying')
+                    _, run = _run_terraform(
+                        context=context,
+                        terraform_bin=terraform_bin,
+                        terraform_dir=terraform_dir,
+                        subcommand='apply',
+                        args=[
+                            '"{}"'.format(os.path.relpath(plan_path, terraform_dir)),
+                        ],
+                        json_runner=json_runner,
+                        profile_history_path=profile_history_path,
+                        echo=True,
+                    )
+            finally:
+                # A saved plan may contain sensitive values, do not leave it behind
+                if plan_path.exists():
+                    plan_path.unlink()
+        else:
             print('Terraform applying')
-            context.run(
-                command=' '.join(filter(None, [
-                    os.path.relpath(terraform_bin, terraform_dir),
-                    'apply',
+            _, run = _run_terraform(
+                context=context,
+                terraform_bin=terraform_bin,
+                terraform_dir=terraform_dir,
+                subcommand='apply',
+                args=[
                     '-var-file="{}"'.format(
                         os.path.relpath(terraform_variables_path, terraform_dir)
                     ) if terraform_variables_factory else None,
+                    _target_args(targets=targets),
                     '-auto-approve' if auto_approve else None,
-                ])),
-                echo=True
+                ],
+                json_runner=json_runner,
+                profile_history_path=profile_history_path,
+                echo=True,
             )
 
         if post_exec:
@@ -133,12 +837,19 @@ def _task_apply(
                 'apply_post_exec',
                 [
                     'terraform_variables',
+                    'plan',
+                    'run',
                 ]
             )(
-                terraform_variables=terraform_variables_dict
+                terraform_variables=terraform_variables_dict,
+                plan=plan,
+                run=run,
             )
             post_exec(context=context, params=params)
 
+    if targets:
+        apply.__doc__ = 'Issue a Terraform apply, targeting {}.'.format(', '.join(targets))
+
     return apply
 
 
@@ -154,9 +865,19 @@ def _task_destroy(
     post_invoke: List[task],
     pre_exec,  # A function to execute before
     post_exec, # A function to execute after
+    targets: List[str] = None,
+    json_runner: bool = False,
+    profile_history_path: Path = None,
 ):
     """
     Create a task to issue a Terraform destroy.
+
+    If targets, the destroy is limited to those resource addresses.
+
+    If json_runner, Terraform is run with machine-readable output and the result is provided to post_exec.
+    Terraform cannot then prompt for approval, so approval is instead obtained before running Terraform.
+
+    If profile_history_path, the json_runner must also be used, and the timing of each resource is reported and recorded.
     """
 
     pre_invoke_combined = [init]
@@ -172,9 +893,10 @@ def _task_destroy(
         """
 
         terraform_variables_dict = {}
+        terraform_variables_changed = False
         if terraform_variables_factory:
             terraform_variables_dict = terraform_variables_factory(context=context)
-            _write_terraform_variables(
+            terraform_variables_changed = _write_terraform_variables(
                 terraform_variables_path=terraform_variables_path,
                 terraform_variables_dict=terraform_variables_dict,
             )
@@ -184,35 +906,56 @@ def _task_destroy(
                 'destroy_pre_exec',
                 [
                     'terraform_variables',
+                    'terraform_variables_changed',
                 ]
             )(
-                terraform_variables=terraform_variables_dict
+                terraform_variables=terraform_variables_dict,
+                terraform_variables_changed=terraform_variables_changed,
             )
             pre_exec(context=context, params=params)
 
-        with context.cd(terraform_dir):
-            print('Terraform destroying')
-            context.run(
-                command=' '.join(filter(None, [
-                    os.path.relpath(terraform_bin, terraform_dir),
-                    'destroy',
-                    '-var-file="{}"'.format(
-                        os.path.relpath(terraform_variables_path, terraform_dir)
-                    ) if terraform_variables_factory else None,
-                ])),
-            )
+        auto_approve = False
+        if json_runner and not _auto_approved(context=context, auto_approve=False, operation='destroy'):
+            response = input('Do you really want to destroy all resources{}? Only \'yes\' will be accepted: '.format(
+                ' targeted by {}'.format(', '.join(targets)) if targets else ' in {}'.format(terraform_dir)
+            ))
+            if response.strip() != 'yes':
+                raise Exit('Destroy cancelled.', code=1)
+            auto_approve = True
+
+        print('Terraform destroying')
+        _, run = _run_terraform(
+            context=context,
+            terraform_bin=terraform_bin,
+            terraform_dir=terraform_dir,
+            subcommand='destroy',
+            args=[
+                '-var-file="{}"'.format(
+                    os.path.relpath(terraform_variables_path, terraform_dir)
+                ) if terraform_variables_factory else None,
+                _target_args(targets=targets),
+                '-auto-approve' if auto_approve else None,
+            ],
+            json_runner=json_runner,
+            profile_history_path=profile_history_path,
+        )
 
         if post_exec:
             params = namedtuple(
                 'destroy_post_exec',
                 [
                     'terraform_variables',
+                    'run',
                 ]
             )(
-                terraform_variables=terraform_variables_dict
+                terraform_variables=terraform_variables_dict,
+                run=run,
             )
             post_exec(context=context, params=params)
 
+    if targets:
+        destroy.__doc__ = 'Issue a Terraform destroy, targeting {}.'.format(', '.join(targets))
+
     return destroy
 
 
@@ -224,34 +967,46 @@ def _task_output(
     init: task,
     output_tuple_factory,
     output_enhance = None, # A function to execute to enhance the output
+    output_from_state: bool = True,
 ):
     """
     Create a task to obtain Terraform output.
-    """
 
-    pre_invoke_combined = [init]
+    If output_from_state, output values are read directly from a local state file when possible.
+    Terraform is initialized and invoked only if the state does not provide the output.
+    """
 
-    @task(
-        pre=pre_invoke_combined
-    )
+    @task
     def output(context):
         """
         Obtain Terraform output.
         """
 
-        with context.cd(terraform_dir):
-            print('Obtaining Terraform output')
-            result = context.run(
-                command=' '.join([
-                    os.path.relpath(terraform_bin, terraform_dir),
-                    'output',
-                    '-json',
-                ]),
-            )
+        output_values = None
+        if output_from_state:
+            output_json = read_outputs_from_state(terraform_dir=terraform_dir)
+            if output_json is not None:
+                output_values = {key: output_json[key]['value'] for key in output_tuple_factory._fields}
+
+        if output_values is None:
+            # Obtaining output from Terraform requires it be initialized
+            init(context)
+
+            with context.cd(terraform_dir):
+                print('Obtaining Terraform output')
+                result = context.run(
+                    command=' '.join([
+                        os.path.relpath(terraform_bin, terraform_dir),
+                        'output',
+                        '-json',
+                    ]),
+                )
 
-        output_json = json.loads(result.stdout.strip())
+            output_json = json.loads(result.stdout.strip())
 
-        output_tuple = output_tuple_factory(**{key: output_json[key]['value'] for key in output_tuple_factory._fields})
+            output_values = {key: output_json[key]['value'] for key in output_tuple_factory._fields}
+
+        output_tuple = output_tuple_factory(**output_values)
 
         if output_enhance:
             return output_enhance(context=context, output=output_tuple)
@@ -261,6 +1016,308 @@ def _task_output(
     return output
 
 
+def _read_state(
+    *,
+    terraform_dir: Path,
+) -> Optional[Dict]:
+    """
+    Read a local state file, or None if there is no local state that can be understood.
+    """
+
+    if not _local_state_authoritative(terraform_dir=terraform_dir):
+        return None
+
+    path_state = Path(terraform_dir, 'terraform.tfstate')
+    if not path_state.exists():
+        return None
+
+    with open(path_state, mode='r') as file_state:
+        json_state = json.load(file_state)
+
+    # Only version 4 is understood, which Terraform has used since 0.12
+    if json_state.get('version') != 4:
+        return None
+
+    return json_state
+
+
+def _state_resource_bytes(
+    *,
+    terraform_dir: Path,
+) -> List[int]:
+    """
+    Measure the size on disk of each resource in the local state, in the order they are stored.
+
+    Each resource is measured by its span within the file, so indentation and escaping are exactly as written.
+    """
+
+    with open(Path(terraform_dir, 'terraform.tfstate'), mode='r', encoding='utf-8') as file_state:
+        text_state = file_state.read()
+
+    decoder = json.JSONDecoder()
+    whitespace = re.compile('\\s*')
+
+    def skip(index: int) -> int:
+        return whitespace.match(text_state, index).end()
+
+    # Walk the keys of the top level object, decoding only as much as needed to find the resources
+    resource_bytes = []
+    index = skip(text_state.index('{') + 1)
+    while index < len(text_state) and text_state[index] != '}':
+        key, index = decoder.raw_decode(text_state, index)
+        index = skip(skip(index) + 1)  # The ':' separating the key from its value
+        if key == 'resources' and text_state[index] == '[':
+            index = skip(index + 1)
+            while text_state[index] != ']':
+                index_start = index
+                _, index = decoder.raw_decode(text_state, index)
+                resource_bytes.append(len(text_state[index_start:index].encode('utf-8')))
+                index = skip(index)
+                if text_state[index] == ',':
+                    index = skip(index + 1)
+            index += 1
+        else:
+            _, index = decoder.raw_decode(text_state, index)
+        index = skip(index)
+        if index < len(text_state) and text_state[index] == ',':
+            index = skip(index + 1)
+
+    return resource_bytes
+
+
+def _state_targets(
+    *,
+    terraform_dir: Path,
+) -> List[str]:
+    """
+    Determine addresses that can be targeted, based on resources in the current state.
+
+    Each module called from the root module is a target (including any index key),
+    as is each managed resource in the root module.
+    """
+
+    json_state = _read_state(terraform_dir=terraform_dir)
+    if json_state is None:
+        return []
+
+    targets = []
+    for resource_current in json_state.get('resources', []):
+        if 'module' in resource_current:
+            # Reduce nested modules (e.g., 'module.a["key"].module.b') to the module called from the root
+            target_current = re.match('module\\.[^.\\[]+(\\[[^\\]]*\\])?', resource_current['module']).group(0)
+        elif resource_current['mode'] == 'managed':
+            target_current = '{}.{}'.format(resource_current['type'], resource_current['name'])
+        else:
+            # Data sources are neither applied nor destroyed
+            continue
+
+        if target_current not in targets:
+            targets.append(target_current)
+
+    return targets
+
+
+def _target_collection_name(target: str) -> str:
+    """
+    Name for the collection of a target (e.g., 'module.x["key"]' becomes 'x_key').
+    """
+
+    name = target[len('module.'):] if target.startswith('module.') else target
+
+    return re.sub('[^A-Za-z0-9]+', '_', name).strip('_')
+
+
+def _target_collection_names(targets: List[str]) -> Dict[str, str]:
+    """
+    Name for the collection of each target, made unique where targets would otherwise share a name
+    (e.g., 'module.x["a"]' and 'module.x_a' both become 'x_a').
+
+    The first target with a name keeps it, and each subsequent target is given a numeric suffix.
+    """
+
+    names_base = [_target_collection_name(target_current) for target_current in targets]
+
+    names = {}
+    names_used = set()
+    for target_current, name_base_current in zip(targets, names_base):
+        name_current = name_base_current
+        suffix = 2
+        while name_current in names_used or (name_current != name_base_current and name_current in names_base):
+            name_current = '{}_{}'.format(name_base_current, suffix)
+            suffix += 1
+
+        names[target_current] = name_current
+        names_used.add(name_current)
+
+    return names
+
+
+# A stack is suggested for splitting if it exceeds any of these
+_SPLIT_RESOURCE_INSTANCES = 250
+_SPLIT_STATE_BYTES = 5 * 1024 * 1024
+_SPLIT_REFRESH_SECONDS = 120.0
+
+
+def _resource_instance_address(
+    *,
+    resource: Dict,
+    instance: Dict,
+) -> str:
+    """
+    Address of a resource instance (e.g., 'module.a["key"].aws_instance.b[0]'), as reported by Terraform.
+    """
+
+    address = '{}{}.{}'.format('data.' if resource['mode'] == 'data' else '', resource['type'], resource['name'])
+    if 'module' in resource:
+        address = '{}.{}'.format(resource['module'], address)
+
+    if 'index_key' in instance:
+        address = '{}[{}]'.format(address, json.dumps(instance['index_key']))
+
+    return address
+
+
+def _state_report(
+    *,
+    terraform_dir: Path,
+) -> Optional[Dict]:
+    """
+    Analyze the local state, or None if there is no local state that can be understood.
+
+    Resources are grouped by module (without index keys, so every instance of a module call is combined)
+    and by resource type. Refresh times are the most recent measured for each resource instance
+    by a profiled plan, apply, or destroy, and are None for a group which has never been measured.
+    """
+
+    json_state = _read_state(terraform_dir=terraform_dir)
+    if json_state is None:
+        return None
+
+    # Most recent refresh time of each resource instance
+    refresh_seconds = {}
+    history = aws_infrastructure.tasks.library.terraform_profile.read_history(
+        history_path=_profile_history_path(terraform_dir=terraform_dir),
+    )
+    for entry_current in history:
+        for resource_current in entry_current.get('resources', []):
+            if resource_current.get('action') == 'refresh':
+                refresh_seconds[resource_current['address']] = resource_current['elapsed_seconds']
+
+    resource_bytes = _state_resource_bytes(terraform_dir=terraform_dir)
+
+    groups = {}
+    for resource_current, bytes_current in zip(json_state.get('resources', []), resource_bytes):
+        key = (
+            re.sub('\\[[^\\]]*\\]', '', resource_current.get('module', '')),
+            '{}{}'.format('data.' if resource_current['mode'] == 'data' else '', resource_current['type']),
+        )
+        group_current = groups.setdefault(key, {
+            'module': key[0] or '(root)',
+            'type': key[1],
+            'instances': 0,
+            'bytes': 0,
+            'refresh_seconds': None,
+        })
+
+        group_current['bytes'] += bytes_current
+
+        for instance_current in resource_current.get('instances', []):
+            group_current['instances'] += 1
+
+            address = _resource_instance_address(resource=resource_current, instance=instance_current)
+            if address in refresh_seconds:
+                group_current['refresh_seconds'] = (group_current['refresh_seconds'] or 0.0) + refresh_seconds[address]
+
+    groups = sorted(
+        groups.values(),
+        key=lambda group_current: (group_current['refresh_seconds'] or 0.0, group_current['bytes']),
+        reverse=True,
+    )
+
+    instances = sum(group_current['instances'] for group_current in groups)
+    state_bytes = Path(terraform_dir, 'terraform.tfstate').stat().st_size
+    refresh_measured = [
+        group_current['refresh_seconds']
+        for group_current in groups
+        if group_current['refresh_seconds'] is not None
+    ]
+    refresh_total = sum(refresh_measured) if refresh_measured else None
+
+    reasons = []
+    if instances > _SPLIT_RESOURCE_INSTANCES:
+        reasons.append('{} resource instances exceeds {}'.format(instances, _SPLIT_RESOURCE_INSTANCES))
+    if state_bytes > _SPLIT_STATE_BYTES:
+        reasons.append('{:.1f} MiB of state exceeds {:.1f} MiB'.format(
+            state_bytes / (1024 * 1024),
+            _SPLIT_STATE_BYTES / (1024 * 1024),
+        ))
+    if refresh_total is not None and refresh_total > _SPLIT_REFRESH_SECONDS:
+        reasons.append('{:.0f}s of combined refresh exceeds {:.0f}s'.format(refresh_total, _SPLIT_REFRESH_SECONDS))
+
+    return {
+        'groups': groups,
+        'instances': instances,
+        'bytes': state_bytes,
+        'refresh_seconds': refresh_total,
+        'split_reasons': reasons,
+    }
+
+
+def _task_state_report(
+    *,
+    config_key: str,
+    terraform_dir: Path,
+):
+    """
+    Create a task to report on the size and refresh cost of the Terraform state.
+    """
+
+    @task
+    def state_report(context):
+        """
+        Report resource counts, state size, and refresh time per module and resource type.
+        """
+
+        report = _state_report(terraform_dir=terraform_dir)
+        if report is None:
+            print('No local Terraform state to report on')
+            return
+
+        print('Terraform state: {} resource instances, {:.1f} KiB{}'.format(
+            report['instances'],
+            report['bytes'] / 1024,
+            ', {:.1f}s combined refresh'.format(report['refresh_seconds']) if report['refresh_seconds'] is not None else '',
+        ))
+
+        if report['groups']:
+            width_module = max(len(group_current['module']) for group_current in report['groups'])
+            width_type = max(len(group_current['type']) for group_current in report['groups'])
+
+            print('  {}  {}  {:>9}  {:>10}  {:>8}'.format(
+                'Module'.ljust(width_module),
+                'Type'.ljust(width_type),
+                'Instances',
+                'Size',
+                'Refresh',
+            ))
+            for group_current in report['groups']:
+                print('  {}  {}  {:>9}  {:>7.1f}KiB  {:>8}'.format(
+                    group_current['module'].ljust(width_module),
+                    group_current['type'].ljust(width_type),
+                    group_current['instances'],
+                    group_current['bytes'] / 1024,
+                    '{:.1f}s'.format(group_current['refresh_seconds']) if group_current['refresh_seconds'] is not None else '-',
+                ))
+
+        if report['refresh_seconds'] is None:
+            print('No refresh times have been measured, apply or destroy with profiling enabled to measure them')
+
+        if report['split_reasons']:
+            print('Consider splitting this stack: {}'.format('; '.join(report['split_reasons'])))
+
+    return state_report
+
+
 def create_tasks(
     *,
     config_key: str,
@@ -280,14 +1337,43 @@ def create_tasks(
     destroy_post_exec=None,
     output_tuple_factory=None,
     output_enhance=None,
+    output_from_state: bool = True,
+    init_incremental: bool = False,
+    apply_plan: bool = False,
+    terraform_plugin_cache_dir: Union[Path, str] = None,
+    terraform_provider_mirror_dir: Union[Path, str] = None,
+    targeted_tasks: bool = False,
+    json_runner: bool = False,
+    profile: bool = False,
+    state_report: bool = False,
 ):
     """
     Create all of the tasks, re-using and passing parameters appropriately.
+
+    If targeted_tasks, a 'target' collection is also created with apply and destroy tasks
+    for each module and resource in the current state.
+
+    If json_runner, apply and destroy parse Terraform's machine-readable output,
+    and the result of each is provided to apply_post_exec and destroy_post_exec.
+
+    If profile, the json_runner is used and apply and destroy report their slowest resources.
+    Any plan preceding an apply is also reported, including its refresh of each resource.
+    The timing of each resource is recorded in a history within the Terraform directory,
+    and the report compares each resource against its previous timings.
+
+    If state_report, a 'state-report' task reports the size and refresh cost of each part of the state,
+    including refresh times measured by profile, and suggests whether the stack should be split.
     """
 
     terraform_bin = Path(terraform_bin)
     terraform_dir = Path(terraform_dir)
     terraform_variables_path = Path(terraform_variables_path) if terraform_variables_path else None
+    terraform_plugin_cache_dir = Path(terraform_plugin_cache_dir) if terraform_plugin_cache_dir else None
+    terraform_provider_mirror_dir = Path(terraform_provider_mirror_dir) if terraform_provider_mirror_dir else None
+
+    # Timings are obtained from the JSON runner
+    json_runner = json_runner or profile
+    profile_history_path = _profile_history_path(terraform_dir=terraform_dir) if profile else None
 
     if terraform_variables_factory is not None:
         if terraform_variables_path is None:
@@ -299,9 +1385,21 @@ def create_tasks(
         config_key=config_key,
         terraform_bin=terraform_bin,
         terraform_dir=terraform_dir,
+        init_incremental=init_incremental,
+        plugin_cache_dir=terraform_plugin_cache_dir,
+        provider_mirror_dir=terraform_provider_mirror_dir,
     )
     ns.add_task(init)
 
+    if terraform_provider_mirror_dir:
+        providers_mirror = _task_providers_mirror(
+            config_key=config_key,
+            terraform_bin=terraform_bin,
+            terraform_dir=terraform_dir,
+            provider_mirror_dir=terraform_provider_mirror_dir,
+        )
+        ns.add_task(providers_mirror)
+
     apply = _task_apply(
         config_key=config_key,
         terraform_bin=terraform_bin,
@@ -314,6 +1412,9 @@ def create_tasks(
         post_invoke=apply_post_invoke,
         pre_exec=apply_pre_exec,
         post_exec=apply_post_exec,
+        apply_plan=apply_plan,
+        json_runner=json_runner,
+        profile_history_path=profile_history_path,
     )
     ns.add_task(apply)
 
@@ -328,9 +1429,64 @@ def create_tasks(
         post_invoke=destroy_post_invoke,
         pre_exec=destroy_pre_exec,
         post_exec=destroy_post_exec,
+        json_runner=json_runner,
+        profile_history_path=profile_history_path,
     )
     ns.add_task(destroy)
 
+    if state_report:
+        ns.add_task(_task_state_report(
+            config_key=config_key,
+            terraform_dir=terraform_dir,
+        ))
+
+    if targeted_tasks:
+        ns_target = Collection('target')
+
+        targets = _state_targets(terraform_dir=terraform_dir)
+        target_names = _target_collection_names(targets)
+        for target_current in targets:
+            ns_target_current = Collection(target_names[target_current])
+
+            ns_target_current.add_task(_task_apply(
+                config_key=config_key,
+                terraform_bin=terraform_bin,
+                terraform_dir=terraform_dir,
+                auto_approve=auto_approve,
+                terraform_variables_factory=terraform_variables_factory,
+                terraform_variables_path=terraform_variables_path,
+                init=init,
+                pre_invoke=apply_pre_invoke,
+                post_invoke=apply_post_invoke,
+                pre_exec=apply_pre_exec,
+                post_exec=apply_post_exec,
+                apply_plan=apply_plan,
+                targets=[target_current],
+                json_runner=json_runner,
+                profile_history_path=profile_history_path,
+            ))
+
+            ns_target_current.add_task(_task_destroy(
+                config_key=config_key,
+                terraform_bin=terraform_bin,
+                terraform_dir=terraform_dir,
+                terraform_variables_factory=terraform_variables_factory,
+                terraform_variables_path=terraform_variables_path,
+                init=init,
+                pre_invoke=destroy_pre_invoke,
+                post_invoke=destroy_post_invoke,
+                pre_exec=destroy_pre_exec,
+                post_exec=destroy_post_exec,
+                targets=[target_current],
+                json_runner=json_runner,
+                profile_history_path=profile_history_path,
+            ))
+
+            ns_target.add_collection(ns_target_current)
+
+        if ns_target.collections:
+            ns.add_collection(ns_target)
+
     if output_tuple_factory:
         output = _task_output(
             config_key=config_key,
@@ -339,6 +1495,7 @@ def create_tasks(
             init=init,
             output_tuple_factory=output_tuple_factory,
             output_enhance=output_enhance,
+            output_from_state=output_from_state,
         )
         ns.add_task(output)
 
@@ -391,30 +1548,58 @@ def create_context_manager_read_only(
     output: task,
 
     output_enhance = None,
+    output_reader = None,  # A function to read output without the output task, returning None if it cannot
+    output_tuple_factory = None,
 ):
     """
     Create a context manager limited to only accessing output.
+
+    If output_reader, it is attempted first (e.g., an S3StateOutputReader from terraform_remote_state).
+    It returns outputs in the same structure as `terraform output -json`,
+    which are provided to output_tuple_factory and then to any output_enhance.
+    The output task is used only if output_reader cannot provide output.
     """
 
+    if output_reader is not None:
+        if output_tuple_factory is None:
+            raise ValueError('If output_reader is provided, output_tuple_factory is required.')
+
     class terraform_context_manager_read_only:
         """
         Context manager for initializing and obtaining output from a Terraform resource.
+
+        Initialization is left to the output task, which requires it only if output cannot be read from state.
         """
 
         def __init__(self, context):
             self._context = context
             self._cached_output = None
 
-            init(self._context)
-
         def __enter__(self):
             return self
 
         def __exit__(self, exc_type, exc_val, exc_tb):
             pass
 
+        def _read_output(self):
+            output_json = output_reader(context=self._context)
+            if output_json is None:
+                return None
+
+            output_tuple = output_tuple_factory(**{
+                key: output_json[key]['value'] for key in output_tuple_factory._fields
+            })
+
+            if output_enhance:
+                return output_enhance(context=self._context, output=output_tuple)
+            else:
+                return output_tuple
+
         @property
         def output(self):
+            if self._cached_output is None and output_reader is not None:
+                self._cached_output = self._read_output()
+
             if self._cached_output is None:
                 self._cached_output = output(self._context)
 
@@ -423,6 +1608,133 @@ def create_context_manager_read_only(
     return terraform_context_manager_read_only
 
 
+def read_outputs(
+    *,
+    context,
+    read_only: Dict[str, type],  # Each name maps to a context manager created by create_context_manager_read_only
+    max_workers: int = None,
+) -> Dict[str, tuple]:
+    """
+    Obtain output from multiple read only context managers concurrently.
+
+    Returns the output of each, keyed by the same names.
+
+    Each context manager receives its own context, as a context cannot be shared across threads.
+    Context managers should be for different Terraform directories, as Terraform may need to be initialized.
+    """
+
+    if not read_only:
+        return {}
+
+    max_workers = max_workers or min(len(read_only), (os.cpu_count() or 1) + 4)
+
+    def read_output(read_only_current: type):
+        with read_only_current(context=Context(config=context.config.clone())) as read_only_context:
+            return read_only_context.output
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name_current: executor.submit(read_output, read_only_current)
+            for name_current, read_only_current in read_only.items()
+        }
+
+        return {
+            name_current: future_current.result()
+            for name_current, future_current in futures.items()
+        }
+
+
+# Terraform writes state indented by two spaces, so the top-level resources begin on a line of their own.
+# A newline cannot appear unescaped within a JSON string, so this cannot match within a value.
+_STATE_RESOURCES_PATTERN = re.compile(b'\\n  "resources": \\[\\s*(\\S)')
+
+# Whether each state file has resources, keyed on its path, remembered with the stat it was determined from
+_state_exists_memo = {}
+
+
+def _state_has_resources(
+    *,
+    path_state: Path,
+) -> bool:
+    """
+    Determine whether a state file has resources, reading only until the start of its resources.
+    """
+
+    with open(path_state, mode='rb') as file_state:
+        buffer = b''
+        while True:
+            chunk = file_state.read(64 * 1024)
+            buffer += chunk
+
+            match = _STATE_RESOURCES_PATTERN.search(buffer)
+            if match:
+                return match.group(1) != b']'
+
+            if not chunk:
+                break
+
+            # Retain enough to match across the boundary with the next chunk
+            buffer = buffer[-64:]
+
+    # Not laid out as Terraform writes state, so fully parse it
+    with open(path_state, mode='r') as file_state:
+        json_state = json.load(file_state)
+
+    return bool(json_state.get('resources'))
+
+
+def state_exists(
+    *,
+    terraform_dir: Union[Path, str],
+) -> bool:
+    """
+    Determine whether there is current Terraform state, meaning a local state file with at least one resource.
+
+    Remembered for each state file until it is modified.
+    """
+
+    path_state = Path(terraform_dir, 'terraform.tfstate').resolve()
+
+    try:
+        stat_state = path_state.stat()
+    except FileNotFoundError:
+        return False
+
+    stat_key = (stat_state.st_mtime_ns, stat_state.st_size)
+    memo = _state_exists_memo.get(path_state)
+    if memo is not None and memo[0] == stat_key:
+        return memo[1]
+
+    result = _state_has_resources(path_state=path_state)
+    _state_exists_memo[path_state] = (stat_key, result)
+
+    return result
+
+
+def states_exist(
+    *,
+    terraform_dirs: List[Union[Path, str]],
+) -> Dict[Path, bool]:
+    """
+    Determine whether there is current Terraform state in each of many directories, checking them concurrently.
+
+    Results are also remembered, so a subsequent exclude_without_state for any of these directories is immediate.
+    Composing many stacks can therefore check all of them in one pass before composing each.
+    """
+
+    terraform_dirs = [Path(terraform_dir_current) for terraform_dir_current in terraform_dirs]
+    if not terraform_dirs:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(terraform_dirs), 8)) as executor:
+        results = executor.map(
+            lambda terraform_dir_current: state_exists(terraform_dir=terraform_dir_current),
+            terraform_dirs,
+        )
+
+        return dict(zip(terraform_dirs, results))
+
+
 def exclude_without_state(
     *,
     terraform_dir: Union[Path, str],
@@ -433,27 +1745,30 @@ def exclude_without_state(
     Helper for excluding additional tasks if there is no current Terraform state.
     """
 
-    terraform_dir = Path(terraform_dir)
-
-    # Determine whether state exists
-    state_exists = True
-
-    # Confirm the state file exists
-    if state_exists:
-        path_state = Path(terraform_dir, 'terraform.tfstate')
-        if not path_state.exists():
-            state_exists = False
-
-    # Confirm the state file is not empty
-    if state_exists:
-        with open(path_state, mode='r') as file_state:
-            json_state = json.load(file_state)
-        if json_state['resources'] == []:
-            state_exists = False
-
     # If no state exists, append the provided list
-    if not state_exists:
+    if not state_exists(terraform_dir=terraform_dir):
         exclude = list(exclude)
         exclude.extend(list(exclude_without_state))
 
     return exclude
+
+
+def read_outputs_from_state(
+    *,
+    terraform_dir: Union[Path, str],
+) -> Optional[Dict]:
+    """
+    Read outputs directly from a local state file, without invoking Terraform.
+
+    Returns outputs in the same structure as `terraform output -json`.
+    Returns None if outputs cannot be read this way (e.g., a remote backend, an unrecognized state version),
+    in which case `terraform output` should be used instead.
+    """
+
+    terraform_dir = Path(terraform_dir)
+
+    json_state = _read_state(terraform_dir=terraform_dir)
+    if json_state is None:
+        return None
+
+    return outputs_from_state(json_state=json_state)
@@ -0,0 +1,168 @@
+"""
+Profiling of Terraform apply and destroy, based on the per-resource timings reported by the JSON runner.
+
+Each profiled run is appended to a history file, one JSON object per line,
+and a report ranks the slowest resources of the run against their previous timings.
+"""
+
+import aws_infrastructure.tasks.library.terraform_runner
+import datetime
+import json
+import os
+from pathlib import Path
+import statistics
+from typing import Dict
+from typing import List
+
+# Actions that change a resource, as opposed to refreshing it
+_CHANGE_ACTIONS = ['create', 'update', 'delete', 'replace', 'read']
+
+# A resource is reported as regressed if it is this much slower than its previous median
+_REGRESSION_RATIO = 1.5
+_REGRESSION_MINIMUM_SECONDS = 10.0
+
+
+def record_run(
+    *,
+    history_path: Path,
+    operation: str,
+    run: aws_infrastructure.tasks.library.terraform_runner.TerraformRunResult,
+):
+    """
+    Append a run to the history.
+    """
+
+    entry = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'operation': operation,
+        'exit_code': run.exit_code,
+        'duration': round(run.duration, 3),
+        'resources': [
+            {
+                'address': resource_current.address,
+                'action': resource_current.action,
+                'elapsed_seconds': resource_current.elapsed_seconds,
+                'errored': resource_current.errored,
+            }
+            for resource_current in run.resources
+        ],
+    }
+
+    os.makedirs(history_path.parent, exist_ok=True)
+    with open(history_path, 'a', encoding='utf-8') as file_history:
+        file_history.write('{}\n'.format(json.dumps(entry, sort_keys=True)))
+
+
+def read_history(
+    *,
+    history_path: Path,
+) -> List[Dict]:
+    """
+    Read all runs in the history, oldest first.
+
+    Lines which cannot be parsed (e.g., from an interrupted write) are skipped.
+    """
+
+    if not history_path.exists():
+        return []
+
+    history = []
+    with open(history_path, 'r', encoding='utf-8') as file_history:
+        for line_current in file_history:
+            try:
+                history.append(json.loads(line_current))
+            except ValueError:
+                pass
+
+    return history
+
+
+def _previous_medians(
+    *,
+    history: List[Dict],
+) -> Dict[tuple, float]:
+    """
+    Median of previous successful timings for each resource address and action.
+    """
+
+    timings = {}
+    for entry_current in history:
+        for resource_current in entry_current.get('resources', []):
+            if resource_current.get('errored'):
+                continue
+
+            key = (resource_current['address'], resource_current['action'])
+            timings.setdefault(key, []).append(resource_current['elapsed_seconds'])
+
+    return {
+        key: statistics.median(timings_current)
+        for key, timings_current in timings.items()
+    }
+
+
+def print_report(
+    *,
+    history_path: Path,
+    operation: str,
+    run: aws_infrastructure.tasks.library.terraform_runner.TerraformRunResult,
+    limit: int = 10,
+):
+    """
+    Print the slowest resources of a run, compared against previous runs in the history.
+
+    Should be called before the run is recorded, so the run is not compared against itself.
+    """
+
+    previous = _previous_medians(history=read_history(history_path=history_path))
+
+    changes = sorted(
+        [
+            resource_current
+            for resource_current in run.resources
+            if resource_current.action in _CHANGE_ACTIONS
+        ],
+        key=lambda resource_current: resource_current.elapsed_seconds,
+        reverse=True,
+    )
+    refreshes = [
+        resource_current
+        for resource_current in run.resources
+        if resource_current.action == 'refresh'
+    ]
+
+    print('Terraform {} profile: {:.1f}s total'.format(operation, run.duration))
+
+    if not changes:
+        print('  No resources were changed')
+    else:
+        width = max(len(resource_current.address) for resource_current in changes[:limit])
+        for resource_current in changes[:limit]:
+            median_previous = previous.get((resource_current.address, resource_current.action))
+
+            comparison = ''
+            if median_previous is not None:
+                comparison = ', previously {:.1f}s'.format(median_previous)
+                if (
+                    resource_current.elapsed_seconds > median_previous * _REGRESSION_RATIO and
+                    resource_current.elapsed_seconds - median_previous > _REGRESSION_MINIMUM_SECONDS
+                ):
+                    comparison = '{} (slower)'.format(comparison)
+
+            print('  {}  {:<7} {:>7.1f}s{}{}'.format(
+                resource_current.address.ljust(width),
+                resource_current.action,
+                resource_current.elapsed_seconds,
+                comparison,
+                ' (errored)' if resource_current.errored else '',
+            ))
+
+        if len(changes) > limit:
+            print('  ... and {} more'.format(len(changes) - limit))
+
+    if refreshes:
+        print('  Refreshed {} resources in {:.1f}s combined'.format(
+            len(refreshes),
+            sum(resource_current.elapsed_seconds for resource_current in refreshes),
+        ))
+
+    print('  History: {}'.format(history_path))
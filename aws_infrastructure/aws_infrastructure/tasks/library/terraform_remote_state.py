@@ -0,0 +1,174 @@
+"""
+Reading of Terraform outputs directly from state stored in an S3 backend, without invoking Terraform.
+
+The state object is fetched with a conditional GET keyed on its ETag,
+so a lookup whose state has not changed transfers no state and is answered from a local cache.
+"""
+
+import aws_infrastructure.tasks.library.terraform
+import boto3
+import botocore.exceptions
+import json
+from pathlib import Path
+from typing import Dict
+from typing import Optional
+from typing import Union
+
+
+class S3StateOutputReader:
+    """
+    Reader of outputs from a Terraform state object in S3.
+
+    Can be provided as the output_reader of a read only context manager.
+    """
+
+    _bucket: str
+    _key: str
+    _cache_path: Path
+    _region: Optional[str]
+    _endpoint_url: Optional[str]
+    _boto_session: Optional[boto3.Session]
+
+    def __init__(
+        self,
+        *,
+        bucket: str,
+        key: str,
+        cache_path: Union[Path, str],
+        region: str = None,
+        endpoint_url: str = None,  # An S3-compatible endpoint (e.g., a local stand-in)
+        boto_session: boto3.Session = None,
+    ):
+        self._bucket = bucket
+        self._key = key
+        self._cache_path = Path(cache_path)
+        self._region = region
+        self._endpoint_url = endpoint_url
+        self._boto_session = boto_session
+
+    @classmethod
+    def from_backend(
+        cls,
+        *,
+        terraform_dir: Union[Path, str],
+        endpoint_url: str = None,
+        boto_session: boto3.Session = None,
+    ) -> Optional['S3StateOutputReader']:
+        """
+        Create a reader from the backend configuration recorded by a Terraform init.
+
+        Returns None if the directory has not been initialized with an S3 backend.
+        """
+
+        terraform_dir = Path(terraform_dir)
+
+        path_backend = Path(terraform_dir, '.terraform', 'terraform.tfstate')
+        if not path_backend.exists():
+            return None
+
+        with open(path_backend, mode='r') as file_backend:
+            json_backend = json.load(file_backend).get('backend', {})
+        if json_backend.get('type') != 's3':
+            return None
+
+        config = json_backend.get('config', {})
+
+        # State for a workspace other than default is stored under a prefix
+        key = config['key']
+        workspace = aws_infrastructure.tasks.library.terraform.read_workspace(terraform_dir=terraform_dir)
+        if workspace != 'default':
+            key = '{}/{}/{}'.format(config.get('workspace_key_prefix') or 'env:', workspace, key)
+
+        return cls(
+            bucket=config['bucket'],
+            key=key,
+            cache_path=Path(terraform_dir, '.terraform', 'remote_state.cache.json'),
+            region=config.get('region'),
+            endpoint_url=endpoint_url or config.get('endpoint') or (config.get('endpoints') or {}).get('s3'),
+            boto_session=boto_session,
+        )
+
+    def _read_cache(self) -> Optional[Dict]:
+        json_cache = aws_infrastructure.tasks.library.terraform.read_json_cache(path_cache=self._cache_path)
+        if json_cache is None:
+            return None
+
+        if json_cache.get('bucket') != self._bucket or json_cache.get('key') != self._key:
+            return None
+
+        return json_cache
+
+    def _write_cache(self, *, etag: str, outputs: Dict):
+        aws_infrastructure.tasks.library.terraform.write_json_cache(
+            path_cache=self._cache_path,
+            json_cache={
+                'bucket': self._bucket,
+                'key': self._key,
+                'etag': etag,
+                'outputs': outputs,
+            },
+        )
+
+    def _client(self):
+        # boto will obtain AWS context from environment variables, but will have obtained those at an unknown time.
+        # Creating a boto session ensures it uses the current value of AWS configuration environment variables.
+        boto_session = self._boto_session or boto3.Session()
+
+        return boto_session.client(
+            's3',
+            region_name=self._region,
+            endpoint_url=self._endpoint_url,
+        )
+
+    def read_outputs(self) -> Optional[Dict]:
+        """
+        Read outputs in the same structure as `terraform output -json`.
+
+        Returns None if outputs cannot be read this way
+        (e.g., no state object, no credentials, no access, an unreachable endpoint, an unrecognized state version).
+        """
+
+        json_cache = self._read_cache()
+
+        request = {
+            'Bucket': self._bucket,
+            'Key': self._key,
+        }
+        if json_cache:
+            request['IfNoneMatch'] = json_cache['etag']
+
+        try:
+            response = self._client().get_object(**request)
+        except botocore.exceptions.ClientError as error:
+            status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            code = error.response.get('Error', {}).get('Code')
+
+            # Not modified since the cached state
+            if json_cache and (status == 304 or code in ['304', 'NotModified']):
+                return json_cache['outputs']
+            if code in ['NoSuchKey', 'NoSuchBucket', '404']:
+                return None
+
+            # Any other failure (e.g., access denied) is left to Terraform, which may be configured differently
+            print('Unable to read Terraform state from S3: {}'.format(error))
+            return None
+        except botocore.exceptions.BotoCoreError as error:
+            # For example, no credentials or an unreachable endpoint
+            print('Unable to read Terraform state from S3: {}'.format(error))
+            return None
+
+        json_state = json.loads(response['Body'].read())
+
+        outputs = aws_infrastructure.tasks.library.terraform.outputs_from_state(json_state=json_state)
+        if outputs is None:
+            return None
+
+        self._write_cache(
+            etag=response['ETag'],
+            outputs=outputs,
+        )
+
+        return outputs
+
+    def __call__(self, *, context) -> Optional[Dict]:
+        return self.read_outputs()
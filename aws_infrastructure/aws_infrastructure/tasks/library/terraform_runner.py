@@ -0,0 +1,291 @@
+"""
+Runner for Terraform commands which parses Terraform's machine-readable UI output.
+
+Commands are given the `-json` flag, and the resulting stream of events is parsed as it arrives.
+Each event's human-readable message is written as a line, per-resource progress and timings are recorded,
+and error diagnostics are raised as a structured exception.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from dataclasses import field
+import datetime
+import json
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class TerraformResourceTiming:
+    address: str
+    """
+    Address of the resource (e.g., 'module.vpc.aws_vpc.vpc').
+    """
+
+    action: str
+    """
+    Action applied to the resource (e.g., 'create', 'update', 'delete', 'refresh').
+    """
+
+    elapsed_seconds: float
+    """
+    Duration of the action.
+    """
+
+    errored: bool
+    """
+    Whether the action failed.
+    """
+
+
+@dataclass(frozen=True)
+class TerraformRunResult:
+    command: str
+    """
+    Command that was executed.
+    """
+
+    exit_code: int
+    """
+    Exit code of the command.
+    """
+
+    duration: float
+    """
+    Duration of the entire command, in seconds.
+    """
+
+    resources: List[TerraformResourceTiming] = field(default_factory=list)
+    """
+    Timing of each resource action, in order of completion.
+    """
+
+    diagnostics: List[Dict] = field(default_factory=list)
+    """
+    Diagnostics reported by Terraform, each including 'severity', 'summary', and 'detail'.
+    """
+
+    change_summary: Optional[Dict] = None
+    """
+    Summary of changes reported by Terraform, including 'add', 'change', and 'remove'.
+    """
+
+    outputs: Optional[Dict] = None
+    """
+    Outputs reported by Terraform, in the structure of `terraform output -json`.
+    """
+
+
+class TerraformError(Exception):
+    """
+    Terraform exited with an error.
+    """
+
+    result: TerraformRunResult
+
+    def __init__(self, result: TerraformRunResult):
+        self.result = result
+
+        errors = [
+            diagnostic_current
+            for diagnostic_current in result.diagnostics
+            if diagnostic_current.get('severity') == 'error'
+        ]
+        if errors:
+            message = '; '.join(
+                '{}{}'.format(
+                    diagnostic_current.get('summary', ''),
+                    ' ({})'.format(diagnostic_current['address']) if diagnostic_current.get('address') else '',
+                )
+                for diagnostic_current in errors
+            )
+        else:
+            message = 'exit code {}'.format(result.exit_code)
+
+        super().__init__('Terraform failed: {}'.format(message))
+
+    @property
+    def diagnostics(self) -> List[Dict]:
+        return self.result.diagnostics
+
+
+def _parse_timestamp(timestamp: Optional[str]) -> Optional[float]:
+    """
+    Parse an event timestamp (e.g., '2022-02-01T12:00:00.123456-08:00') into seconds.
+    """
+
+    if not timestamp:
+        return None
+
+    # Python versions prior to 3.11 do not accept a 'Z' suffix
+    if timestamp.endswith('Z'):
+        timestamp = '{}+00:00'.format(timestamp[:-1])
+
+    try:
+        return datetime.datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return None
+
+
+class _EventParser:
+    """
+    Incremental parser for a stream of Terraform JSON events.
+    """
+
+    def __init__(self, *, out_stream):
+        self._out_stream = out_stream
+
+        self.resources = []
+        self.diagnostics = []
+        self.change_summary = None
+        self.outputs = None
+
+        self._refresh_started = {}
+
+    def _write(self, line: str):
+        self._out_stream.write('{}\n'.format(line))
+        self._out_stream.flush()
+
+    def parse_line(self, line: str):
+        line = line.rstrip('\r\n')
+        if not line:
+            return
+
+        try:
+            event = json.loads(line)
+        except ValueError:
+            # Not every line is guaranteed to be an event (e.g., a crash)
+            self._write(line)
+            return
+
+        event_type = event.get('type')
+        hook = event.get('hook', {})
+        address = hook.get('resource', {}).get('addr')
+
+        if event_type == 'diagnostic':
+            diagnostic = dict(event.get('diagnostic', {}))
+            self.diagnostics.append(diagnostic)
+            self._write('{}: {}'.format(diagnostic.get('severity', '').capitalize(), diagnostic.get('summary', '')))
+            if diagnostic.get('detail'):
+                for line_detail in diagnostic['detail'].splitlines():
+                    self._write('  {}'.format(line_detail))
+            return
+
+        if event_type != 'version':
+            self._write(event.get('@message', line))
+
+        if event_type == 'refresh_start':
+            self._refresh_started[address] = _parse_timestamp(event.get('@timestamp'))
+        elif event_type == 'refresh_complete':
+            time_started = self._refresh_started.pop(address, None)
+            time_completed = _parse_timestamp(event.get('@timestamp'))
+            if time_started is not None and time_completed is not None:
+                self.resources.append(TerraformResourceTiming(
+                    address=address,
+                    action='refresh',
+                    elapsed_seconds=max(0.0, time_completed - time_started),
+                    errored=False,
+                ))
+        elif event_type in ['apply_complete', 'apply_errored']:
+            self.resources.append(TerraformResourceTiming(
+                address=address,
+                action=hook.get('action', ''),
+                elapsed_seconds=float(hook.get('elapsed_seconds', 0)),
+                errored=event_type == 'apply_errored',
+            ))
+        elif event_type == 'change_summary':
+            self.change_summary = dict(event.get('changes', {}))
+        elif event_type == 'outputs':
+            self.outputs = dict(event.get('outputs', {}))
+
+
+async def run_terraform_json_async(
+    *,
+    command: str,
+    terraform_dir: Path,
+    env: Dict[str, str] = None,
+    out_stream=None,
+    allowed_exit_codes: List[int] = None,
+) -> TerraformRunResult:
+    """
+    Run a Terraform command which has been given the `-json` flag, parsing its events as they arrive.
+
+    Raises TerraformError if the command exits with a code not in allowed_exit_codes.
+    """
+
+    out_stream = out_stream or sys.stdout
+    allowed_exit_codes = allowed_exit_codes or [0]
+
+    env_combined = dict(os.environ)
+    env_combined.update(env or {})
+
+    parser = _EventParser(out_stream=out_stream)
+
+    time_start = time.monotonic()
+    process = await asyncio.create_subprocess_shell(
+        command,
+        cwd=terraform_dir,
+        env=env_combined,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # Events describing large resources can exceed the default line limit
+        limit=16 * 1024 * 1024,
+    )
+
+    async def read_events():
+        async for line in process.stdout:
+            parser.parse_line(line.decode('utf-8', errors='replace'))
+
+    async def read_errors():
+        # Output on stderr is not structured, pass it through
+        async for line in process.stderr:
+            out_stream.write(line.decode('utf-8', errors='replace'))
+            out_stream.flush()
+
+    await asyncio.gather(read_events(), read_errors())
+    exit_code = await process.wait()
+
+    result = TerraformRunResult(
+        command=command,
+        exit_code=exit_code,
+        duration=time.monotonic() - time_start,
+        resources=parser.resources,
+        diagnostics=parser.diagnostics,
+        change_summary=parser.change_summary,
+        outputs=parser.outputs,
+    )
+
+    if exit_code not in allowed_exit_codes:
+        raise TerraformError(result)
+
+    return result
+
+
+def run_terraform_json(
+    *,
+    context,
+    command: str,
+    terraform_dir: Path,
+    allowed_exit_codes: List[int] = None,
+    echo: bool = False,
+) -> TerraformRunResult:
+    """
+    Run a Terraform command from a task, using the environment and output stream configured in its context.
+    """
+
+    if echo:
+        print(command)
+
+    return asyncio.run(run_terraform_json_async(
+        command=command,
+        terraform_dir=terraform_dir,
+        env=context.config.run.env,
+        out_stream=context.config.run.out_stream,
+        allowed_exit_codes=allowed_exit_codes,
+    ))
@@ -0,0 +1,372 @@
+"""
+Tasks for concurrently initializing, applying, and destroying multiple Terraform stacks.
+
+Each stack is a collection created by `terraform.create_tasks` (or a library wrapper of it).
+Declared dependencies between stacks are respected, so that a stack is applied only after
+every stack it depends on, and destroyed only after every stack that depends on it.
+Independent stacks run at the same time within a bounded pool of workers.
+"""
+
+import concurrent.futures
+from invoke import Collection
+from invoke import Context
+from invoke import Exit
+from invoke import task
+from invoke.tasks import Call
+import io
+import os
+import sys
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+class _PrefixedStream(io.TextIOBase):
+    """
+    Stream which writes complete lines to a target stream, each prefixed with a stack name.
+
+    Partial lines are buffered until completed, so concurrent stacks never interleave within a line.
+    Each source of output (e.g., stdout and stderr) requires its own stream, so their partial lines are not merged,
+    while streams share a lock that guards both their buffers and the target.
+    """
+
+    _prefix: str
+    _target: io.TextIOBase
+    _lock: threading.Lock
+    _buffer: str
+
+    def __init__(self, *, prefix: str, target, lock: threading.Lock):
+        super().__init__()
+
+        self._prefix = prefix
+        self._target = target
+        self._lock = lock
+        self._buffer = ''
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        with self._lock:
+            self._buffer += data
+
+            lines = self._buffer.split('\n')
+            self._buffer = lines.pop()
+            if lines:
+                for line_current in lines:
+                    self._target.write('{}{}\n'.format(self._prefix, line_current.rstrip('\r')))
+                self._target.flush()
+
+        return len(data)
+
+    def flush(self):
+        # Partial lines remain buffered until completed or until finish
+        pass
+
+    def finish(self):
+        """
+        Write any remaining partial line.
+        """
+        with self._lock:
+            if self._buffer:
+                self._target.write('{}{}\n'.format(self._prefix, self._buffer.rstrip('\r')))
+                self._target.flush()
+                self._buffer = ''
+
+
+class _ThreadStdout(io.TextIOBase):
+    """
+    Replacement for sys.stdout which directs each thread's output to the stream registered for that thread.
+
+    Allows output from print() within a stack's tasks to receive that stack's prefix.
+    """
+
+    def __init__(self, *, default):
+        super().__init__()
+
+        self._default = default
+        self._streams = {}
+
+    def register(self, stream):
+        self._streams[threading.get_ident()] = stream
+
+    def unregister(self):
+        self._streams.pop(threading.get_ident(), None)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        return self._streams.get(threading.get_ident(), self._default).write(data)
+
+    def flush(self):
+        self._streams.get(threading.get_ident(), self._default).flush()
+
+
+def _validate_dependencies(
+    *,
+    stack_names: List[str],
+    dependencies: Dict[str, List[str]],
+):
+    """
+    Ensure dependencies reference known stacks and contain no cycles.
+    """
+
+    for name_current, dependencies_current in dependencies.items():
+        for name_dependency in [name_current] + list(dependencies_current):
+            if name_dependency not in stack_names:
+                raise ValueError('Unknown stack in dependencies: "{}"'.format(name_dependency))
+
+    # Depth-first search for a cycle
+    visiting = set()
+    visited = set()
+
+    def visit(name_current: str, path: List[str]):
+        if name_current in visited:
+            return
+        if name_current in visiting:
+            raise ValueError('Cycle in stack dependencies: {}'.format(' -> '.join(path + [name_current])))
+
+        visiting.add(name_current)
+        for name_dependency in dependencies.get(name_current, []):
+            visit(name_dependency, path + [name_current])
+        visiting.remove(name_current)
+        visited.add(name_current)
+
+    for name_current in stack_names:
+        visit(name_current, [])
+
+
+def _reverse_dependencies(
+    *,
+    stack_names: List[str],
+    dependencies: Dict[str, List[str]],
+) -> Dict[str, List[str]]:
+    """
+    Reverse dependencies, so each stack instead lists the stacks which depend on it.
+    """
+
+    dependents = {name_current: [] for name_current in stack_names}
+    for name_current, dependencies_current in dependencies.items():
+        for name_dependency in dependencies_current:
+            dependents[name_dependency].append(name_current)
+
+    return dependents
+
+
+def _run_graph(
+    *,
+    stack_names: List[str],
+    dependencies: Dict[str, List[str]],
+    run_stack: Callable[[str], None],
+    max_workers: int,
+) -> Dict[str, Optional[BaseException]]:
+    """
+    Run every stack after the stacks it depends on, running independent stacks concurrently.
+
+    After any failure, no further stacks are started but those already running are allowed to finish.
+    Returns the result of each stack that was started: None for success, otherwise the exception.
+    """
+
+    remaining = {
+        name_current: set(dependencies.get(name_current, []))
+        for name_current in stack_names
+    }
+    results = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        failed = False
+
+        while True:
+            # Start every stack whose dependencies have completed
+            if not failed:
+                for name_current in [name for name, pending in remaining.items() if not pending]:
+                    del remaining[name_current]
+                    running[executor.submit(run_stack, name_current)] = name_current
+
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future_current in done:
+                name_current = running.pop(future_current)
+                results[name_current] = future_current.exception()
+
+                if results[name_current] is None:
+                    for pending in remaining.values():
+                        pending.discard(name_current)
+                else:
+                    failed = True
+
+    return results
+
+
+def _run_stacks(
+    *,
+    context,
+    operation: str,
+    stacks: Dict[str, Collection],
+    dependencies: Dict[str, List[str]],
+    max_workers: int,
+    auto_approve: bool,
+):
+    """
+    Run an operation across all stacks, with output from each stack prefixed by its name.
+    """
+
+    stack_names = list(stacks.keys())
+
+    # Approval is obtained once for all stacks,
+    # as concurrent stacks cannot share the terminal for interactive prompts
+    if operation in ['apply', 'destroy'] and not auto_approve:
+        print('Stacks to {}: {}'.format(operation, ', '.join(stack_names)))
+        response = input('Do you want to {} these stacks? Only \'yes\' will be accepted: '.format(operation))
+        if response.strip() != 'yes':
+            print('Cancelled')
+            return
+
+    prefix_width = max(len(name_current) for name_current in stack_names)
+    lock_output = threading.Lock()
+    stdout_original = sys.stdout
+    stdout_thread = _ThreadStdout(default=stdout_original)
+
+    durations = {}
+
+    def run_stack(name_current: str):
+        prefix_current = '[{}] '.format(name_current.ljust(prefix_width))
+        stream_out = _PrefixedStream(prefix=prefix_current, target=stdout_original, lock=lock_output)
+        stream_err = _PrefixedStream(prefix=prefix_current, target=stdout_original, lock=lock_output)
+
+        # Each stack receives its own context, both for its own working directory and for its own output.
+        # Terraform must not prompt, so approval obtained above is applied here.
+        context_current = Context(config=context.config.clone())
+        context_current.config.run.out_stream = stream_out
+        context_current.config.run.err_stream = stream_err
+        context_current.config.run.in_stream = False
+        context_current.config.run.env = dict(context_current.config.run.env or {})
+        context_current.config.run.env['TF_INPUT'] = '0'
+        if operation in ['apply', 'destroy']:
+            context_current.config.run.env['TF_CLI_ARGS_{}'.format(operation)] = '-auto-approve'
+
+        stdout_thread.register(stream_out)
+        time_start = time.monotonic()
+        try:
+            task_operation = stacks[name_current].tasks[operation]
+
+            # Run the same sequence Invoke would run for the task
+            for call_current in list(task_operation.pre) + [task_operation] + list(task_operation.post):
+                if isinstance(call_current, Call):
+                    call_current.task(context_current, *call_current.args, **call_current.kwargs)
+                else:
+                    call_current(context_current)
+        finally:
+            durations[name_current] = time.monotonic() - time_start
+            stream_out.finish()
+            stream_err.finish()
+            stdout_thread.unregister()
+
+    time_start = time.monotonic()
+    sys.stdout = stdout_thread
+    try:
+        results = _run_graph(
+            stack_names=stack_names,
+            dependencies=dependencies,
+            run_stack=run_stack,
+            max_workers=max_workers,
+        )
+    finally:
+        sys.stdout = stdout_original
+    duration_total = time.monotonic() - time_start
+
+    # Summarize
+    print('Stack {} summary:'.format(operation))
+    for name_current in stack_names:
+        if name_current not in results:
+            status_current = 'not started'
+        elif results[name_current] is None:
+            status_current = 'succeeded in {:.1f}s'.format(durations[name_current])
+        else:
+            status_current = 'failed in {:.1f}s ({})'.format(
+                durations[name_current],
+                type(results[name_current]).__name__,
+            )
+        print('  {}: {}'.format(name_current.ljust(prefix_width), status_current))
+    print('  Total: {:.1f}s, compared to {:.1f}s if run sequentially'.format(duration_total, sum(durations.values())))
+
+    failed = [name_current for name_current, result_current in results.items() if result_current is not None]
+    if failed or len(results) < len(stack_names):
+        raise Exit('Stack {} failed: {}'.format(operation, ', '.join(failed)), code=1)
+
+
+def create_tasks(
+    *,
+    config_key: str,
+    stacks: Dict[str, Collection],
+    dependencies: Dict[str, List[str]] = None,  # Each stack name maps to the stack names it depends on
+    max_workers: int = None,
+    auto_approve: bool = False,
+):
+    """
+    Create all of the tasks, re-using and passing parameters appropriately.
+    """
+
+    dependencies = dependencies or {}
+    max_workers = max_workers or max(1, min(len(stacks), (os.cpu_count() or 1) + 4))
+
+    stack_names = list(stacks.keys())
+    _validate_dependencies(stack_names=stack_names, dependencies=dependencies)
+    dependents = _reverse_dependencies(stack_names=stack_names, dependencies=dependencies)
+
+    ns = Collection('stacks')
+
+    @task
+    def init(context):
+        """
+        Initialize all stacks concurrently.
+        """
+        _run_stacks(
+            context=context,
+            operation='init',
+            stacks=stacks,
+            dependencies={},
+            max_workers=max_workers,
+            auto_approve=auto_approve,
+        )
+
+    @task
+    def apply(context):
+        """
+        Apply all stacks, concurrently where dependencies allow.
+        """
+        _run_stacks(
+            context=context,
+            operation='apply',
+            stacks=stacks,
+            dependencies=dependencies,
+            max_workers=max_workers,
+            auto_approve=auto_approve,
+        )
+
+    @task
+    def destroy(context):
+        """
+        Destroy all stacks, concurrently where dependencies allow.
+        """
+        _run_stacks(
+            context=context,
+            operation='destroy',
+            stacks=stacks,
+            dependencies=dependents,
+            max_workers=max_workers,
+            auto_approve=auto_approve,
+        )
+
+    ns.add_task(init)
+    ns.add_task(apply)
+    ns.add_task(destroy)
+
+    return ns
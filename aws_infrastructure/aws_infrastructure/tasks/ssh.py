@@ -1,14 +1,44 @@
+import aws_infrastructure.tasks.files
+import atexit
+import base64
+import bisect
+import codecs
+import collections
+import concurrent.futures
+from dataclasses import asdict
+from dataclasses import dataclass
+import hashlib
 import io
+import json
+import os
 import paramiko
 from pathlib import Path
+from pathlib import PurePosixPath
+import queue
 import ruamel.yaml
 import select
-import socketserver
+import selectors
+import shlex
+import socket
 import threading
+import time
+from typing import Callable
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Union
 
+# Configurations are cached by path, and reloaded only if their file changes
+_ssh_config_cache: Dict[Path, Tuple[Tuple[int, int], 'SSHConfig']] = {}
+_ssh_config_cache_lock = threading.Lock()
+_ssh_config_yaml = ruamel.yaml.YAML(typ="safe", pure=True)
+
+# Parsed keys are cached by a hash of their content
+_pkey_cache: Dict[str, paramiko.PKey] = {}
+_pkey_cache_lock = threading.Lock()
+
+
 class SSHConfig:
     """
     Configuration for SSH connection to an instance.
@@ -18,28 +48,55 @@ class SSHConfig:
     _key: str
     _key_file: Path
     _user: str
+    _port: int
+    _known_hosts_path: Optional[Path]
 
-    def __init__(self, *, ip: str, key: str, key_file: Union[Path, str], user: str):
+    def __init__(
+        self,
+        *,
+        ip: str,
+        key: str,
+        key_file: Union[Path, str],
+        user: str,
+        port: int = 22,
+        known_hosts_path: Union[Path, str] = None,  # If None, host keys are only remembered within this process
+    ):
         self._ip = ip
         self._key = key
         self._key_file = Path(key_file)
         self._user = user
+        self._port = port
+        self._known_hosts_path = Path(known_hosts_path) if known_hosts_path is not None else None
 
     @staticmethod
     def load(ssh_config_path: Union[Path, str]):
         # TODO: rename parameter to config_path for consistency
-        config_path = Path(ssh_config_path)
+        config_path = Path(ssh_config_path).resolve()
 
-        with open(config_path) as config_file:
-            yaml = ruamel.yaml.YAML(typ="safe", pure=True)
-            config_dict = yaml.load(config_file)
+        stat = config_path.stat()
+        stat_key = (stat.st_mtime_ns, stat.st_size)
 
-        return SSHConfig(
-            ip=config_dict['ip'],
-            key=config_dict['key'],
-            key_file=config_dict['key_file'],
-            user=config_dict['user'],
-        )
+        with _ssh_config_cache_lock:
+            cached = _ssh_config_cache.get(config_path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+
+            with open(config_path) as config_file:
+                config_dict = _ssh_config_yaml.load(config_file)
+
+            ssh_config = SSHConfig(
+                ip=config_dict['ip'],
+                key=config_dict['key'],
+                key_file=config_dict['key_file'],
+                user=config_dict['user'],
+                port=config_dict.get('port', 22),
+                # Shared with any external SSH session
+                known_hosts_path=Path(config_path.parent, 'known_hosts'),
+            )
+
+            _ssh_config_cache[config_path] = (stat_key, ssh_config)
+
+        return ssh_config
 
     @property
     def ip(self) -> str:
@@ -57,6 +114,112 @@ class SSHConfig:
     def user(self) -> str:
         return self._user
 
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def known_hosts_path(self) -> Optional[Path]:
+        return self._known_hosts_path
+
+    @property
+    def pkey(self) -> paramiko.PKey:
+        """
+        The parsed private key, which is parsed only once per process.
+        """
+
+        key_hash = hashlib.sha256(self._key.encode('utf-8')).hexdigest()
+
+        with _pkey_cache_lock:
+            pkey = _pkey_cache.get(key_hash)
+            if pkey is None:
+                pkey = paramiko.rsakey.RSAKey.from_private_key(io.StringIO(self._key))
+                _pkey_cache[key_hash] = pkey
+
+        return pkey
+
+
+@dataclass(frozen=True)
+class SSHCommandResult:
+    """
+    Result of executing a command.
+    """
+
+    command: str
+    exit_status: Optional[int]  # None if the command did not complete
+    stdout: str
+    stderr: str
+    duration: float  # Seconds
+
+
+class SSHCommandError(Exception):
+    """
+    A command failed, with the result it obtained.
+    """
+
+    result: SSHCommandResult
+
+    def __init__(self, result: SSHCommandResult):
+        self.result = result
+
+        super().__init__(self._message())
+
+    def _message(self) -> str:
+        return 'Command exited with status {}'.format(self.result.exit_status)
+
+
+class SSHCommandTimeout(SSHCommandError):
+    """
+    A command did not complete within its timeout, with the output obtained before it was closed.
+    """
+
+    def _message(self) -> str:
+        return 'Command timed out after {:.1f}s'.format(self.result.duration)
+
+
+class SSHCommandCancelled(SSHCommandError):
+    """
+    A command was cancelled, with the output obtained before it was closed.
+    """
+
+    def _message(self) -> str:
+        return 'Command cancelled after {:.1f}s'.format(self.result.duration)
+
+
+class _SSHCommandStream:
+    """
+    Decodes one output stream of a command, passing on each complete line as it arrives.
+    """
+
+    def __init__(self, *, handle_line: Callable[[str], None]):
+        self._handle_line = handle_line
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._captured = io.StringIO()
+        self._partial = ''
+
+    def feed(self, data: bytes):
+        text = self._decoder.decode(data)
+        self._captured.write(text)
+
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line_current in lines:
+            self._handle_line(line_current)
+
+    def finish(self) -> str:
+        """
+        Pass on any incomplete final line, returning everything captured.
+        """
+        text = self._decoder.decode(b'', final=True)
+        self._captured.write(text)
+
+        partial = self._partial + text
+        self._partial = ''
+        if partial:
+            self._handle_line(partial)
+
+        return self._captured.getvalue()
+
 
 class SSHClient:
     """
@@ -64,79 +227,162 @@ class SSHClient:
     """
 
     _ssh_config: SSHConfig
+    _pooled: bool
 
     _paramiko_ssh_client: paramiko.SSHClient
 
-    def __init__(self, *, ssh_config: SSHConfig):
+    def __init__(self, *, ssh_config: SSHConfig, pooled: bool = True):
         self._ssh_config = ssh_config
+        self._pooled = pooled
 
         self._paramiko_ssh_client = None
 
-    def exec_command(self, *, command: Union[str, List[str]]):
+    def exec_command(
+        self,
+        *,
+        command: Union[str, List[str]],
+        echo: bool = True,
+        timeout: float = None,
+        cancel: threading.Event = None,
+        check: bool = False,
+        on_stdout: Callable[[str], None] = None,
+        on_stderr: Callable[[str], None] = None,
+    ) -> SSHCommandResult:
         """
         Execute a command, print the command with its stdout and stderr.
+
+        Output is printed as it arrives, with stdout and stderr read together
+        so a command writing heavily to either cannot stall waiting for the other to be read.
+        Each line is also provided to any on_stdout or on_stderr.
+
+        Returns the exit status and output. If check, raises SSHCommandError for a non-zero exit status.
+        If the command exceeds timeout seconds, raises SSHCommandTimeout.
+        If cancel is set while the command executes, raises SSHCommandCancelled.
+        Either closes the channel, which ends the command on servers that hang up sessions when closed.
         """
 
-        print('Command')
         if isinstance(command, str):
-            # Single commands are just printed and passed through
-            print('  ' + command)
+            command_lines = [command]
         elif isinstance(command, List):
-            # Multiple commands are printed, then reformatted into a single command
-            for command_current in command:
-                print('  ' + command_current)
-
+            # Multiple commands are reformatted into a single command
+            command_lines = command
             command = '\n'.join(command)
         else:
             raise ValueError
 
-        stdin, stdout, stderr = self._paramiko_ssh_client.exec_command(
-            command=command
-        )
+        if echo:
+            print('Command')
+            for command_current in command_lines:
+                print('  ' + command_current)
 
-        line = stdout.readline()
-        if line:
-            print('Output')
-            while line:
-                print('  ' + line.rstrip())
-                line = stdout.readline()
+        # Print a section header whenever output switches between stdout and stderr
+        section_current = [None]
 
-        line = stderr.readline()
-        if line:
-            print('Error')
-            while line:
+        def handle_line(section: str, line: str, callback):
+            if echo:
+                if section_current[0] != section:
+                    print(section)
+                    section_current[0] = section
                 print('  ' + line.rstrip())
-                line = stderr.readline()
+            if callback:
+                callback(line)
+
+        time_start = time.monotonic()
+
+        channel = self._paramiko_ssh_client.get_transport().open_session()
+        try:
+            channel.exec_command(command)
+            # Commands receive no input
+            channel.shutdown_write()
+
+            stdout = _SSHCommandStream(handle_line=lambda line: handle_line('Output', line, on_stdout))
+            stderr = _SSHCommandStream(handle_line=lambda line: handle_line('Error', line, on_stderr))
+
+            def partial_result():
+                return SSHCommandResult(
+                    command=command,
+                    exit_status=None,
+                    stdout=stdout.finish(),
+                    stderr=stderr.finish(),
+                    duration=time.monotonic() - time_start,
+                )
 
-    def open(self):
+            while True:
+                received = False
+                if channel.recv_ready():
+                    stdout.feed(channel.recv(32 * 1024))
+                    received = True
+                if channel.recv_stderr_ready():
+                    stderr.feed(channel.recv_stderr(32 * 1024))
+                    received = True
+
+                if not received:
+                    if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                        break
+
+                    if cancel is not None and cancel.is_set():
+                        raise SSHCommandCancelled(partial_result())
+                    if timeout is not None and time.monotonic() - time_start > timeout:
+                        raise SSHCommandTimeout(partial_result())
+
+                    # Channel becomes readable with stdout, closing, or exit status.
+                    # Stderr does not wake it, so wait only briefly.
+                    select.select([channel], [], [], 0.05)
+
+            result = SSHCommandResult(
+                command=command,
+                exit_status=channel.recv_exit_status(),
+                stdout=stdout.finish(),
+                stderr=stderr.finish(),
+                duration=time.monotonic() - time_start,
+            )
+        finally:
+            channel.close()
+
+        if check and result.exit_status != 0:
+            raise SSHCommandError(result)
+
+        return result
+
+    def exec_command_capture(
+        self,
+        *,
+        command: Union[str, List[str]],
+        timeout: float = None,
+        cancel: threading.Event = None,
+    ) -> SSHCommandResult:
         """
-        Connect an SSH client to the instance.
+        Execute a command, capturing its stdout, stderr, and exit status instead of printing them.
         """
-        class IgnorePolicy(paramiko.MissingHostKeyPolicy):
-            """
-            Policy for ignoring missing host keys.
 
-            TODO: It would be better to know and confirm the host key.
-            """
-
-            def missing_host_key(self, client, hostname, key):
-                return
-
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(IgnorePolicy())
-        client.connect(
-            hostname=self._ssh_config.ip,
-            username=self._ssh_config.user,
-            pkey=paramiko.rsakey.RSAKey.from_private_key(io.StringIO(self._ssh_config.key))
+        return self.exec_command(
+            command=command,
+            echo=False,
+            timeout=timeout,
+            cancel=cancel,
         )
 
-        self._paramiko_ssh_client = client
+    def open(self):
+        """
+        Connect an SSH client to the instance.
+
+        If pooled, an existing connection to the instance is re-used if available.
+        """
+        if self._pooled:
+            self._paramiko_ssh_client = ssh_connection_pool.acquire(ssh_config=self._ssh_config)
+        else:
+            self._paramiko_ssh_client = _connect(ssh_config=self._ssh_config)
 
     def close(self):
         """
         Destroy the SSH connection.
+
+        If pooled, the connection is instead returned to the pool.
         """
-        self._paramiko_ssh_client.close()
+        if self._pooled:
+            ssh_connection_pool.release(ssh_config=self._ssh_config, paramiko_ssh_client=self._paramiko_ssh_client)
+        else:
+            self._paramiko_ssh_client.close()
         self._paramiko_ssh_client = None
 
     @property
@@ -144,6 +390,241 @@ class SSHClient:
         return self._paramiko_ssh_client
 
 
+# Host keys recorded for configurations which have no known hosts file
+_known_hosts_process = paramiko.HostKeys()
+_known_hosts_lock = threading.Lock()
+
+
+class _RecordHostKeyPolicy(paramiko.MissingHostKeyPolicy):
+    """
+    Policy for trusting a host key on first connection, recording it so later connections verify it.
+
+    A host whose key does not match a recorded key is rejected by Paramiko before this policy is consulted.
+    """
+
+    _known_hosts_path: Optional[Path]
+
+    def __init__(self, *, known_hosts_path: Optional[Path]):
+        self._known_hosts_path = known_hosts_path
+
+    def missing_host_key(self, client, hostname, key):
+        with _known_hosts_lock:
+            if self._known_hosts_path is None:
+                _known_hosts_process.add(hostname, key.get_name(), key)
+            else:
+                # Append rather than rewrite, so entries from an external SSH session are preserved
+                self._known_hosts_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self._known_hosts_path, mode='a') as known_hosts_file:
+                    known_hosts_file.write('{} {} {}\n'.format(hostname, key.get_name(), key.get_base64()))
+
+
+class SSHHostKeyMismatch(paramiko.SSHException):
+    """
+    The instance presented a host key which differs from the key previously recorded for its address.
+
+    This is expected if the address was re-used by a replaced instance (e.g., an Elastic IP),
+    in which case the recorded key should be removed from the known hosts.
+    """
+
+    hostname: str
+    known_hosts_path: Optional[Path]
+
+    def __init__(self, *, hostname: str, known_hosts_path: Optional[Path]):
+        self.hostname = hostname
+        self.known_hosts_path = known_hosts_path
+
+        if known_hosts_path is None:
+            remedy = 'restart to discard the key recorded by this process'
+        else:
+            remedy = 'remove the entry for {} from the known hosts file: {}'.format(hostname, known_hosts_path)
+
+        super().__init__(
+            'Host key for {} does not match the key previously recorded. '
+            'If the instance was replaced, {}'.format(hostname, remedy)
+        )
+
+
+def _connect(*, ssh_config: SSHConfig) -> paramiko.SSHClient:
+    """
+    Connect a new Paramiko client to the instance.
+    """
+
+    client = paramiko.SSHClient()
+
+    # Host keys which are already known are verified, otherwise they are recorded
+    if ssh_config.known_hosts_path is None:
+        with _known_hosts_lock:
+            for hostname_current, keys_current in _known_hosts_process.items():
+                for key_type_current, key_current in keys_current.items():
+                    client.get_host_keys().add(hostname_current, key_type_current, key_current)
+    elif ssh_config.known_hosts_path.exists():
+        with _known_hosts_lock:
+            client.load_system_host_keys(filename=str(ssh_config.known_hosts_path))
+    client.set_missing_host_key_policy(_RecordHostKeyPolicy(known_hosts_path=ssh_config.known_hosts_path))
+
+    try:
+        client.connect(
+            hostname=ssh_config.ip,
+            port=ssh_config.port,
+            username=ssh_config.user,
+            pkey=ssh_config.pkey,
+        )
+    except paramiko.BadHostKeyException as e:
+        client.close()
+        # Name the host as it appears in known hosts, which includes any non-default port
+        raise SSHHostKeyMismatch(
+            hostname=ssh_config.ip if ssh_config.port == 22 else '[{}]:{}'.format(ssh_config.ip, ssh_config.port),
+            known_hosts_path=ssh_config.known_hosts_path,
+        ) from e
+
+    return client
+
+
+class _PooledConnection:
+    """
+    A connection in the pool, with the number of clients currently using it.
+    """
+
+    paramiko_ssh_client: Optional[paramiko.SSHClient]
+    references: int
+    time_released: float
+    lock_connect: threading.Lock
+
+    def __init__(self):
+        self.paramiko_ssh_client = None
+        self.references = 0
+        self.time_released = time.monotonic()
+        self.lock_connect = threading.Lock()
+
+
+class SSHConnectionPool:
+    """
+    Pool of SSH connections, allowing tasks within a process to share a connection to an instance.
+
+    Connections are keyed on the instance, port, user, and key.
+    A connection is shared by every client using it, as its transport multiplexes channels.
+    Connections are kept alive, checked before being re-used, and closed after being idle too long.
+    """
+
+    _keepalive_interval: int
+    _idle_timeout: float
+
+    _lock: threading.Lock
+    _connections: Dict[tuple, _PooledConnection]
+
+    def __init__(self, *, keepalive_interval: int = 30, idle_timeout: float = 300):
+        self._keepalive_interval = keepalive_interval
+        self._idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._connections = {}
+
+    @staticmethod
+    def _key(ssh_config: SSHConfig) -> tuple:
+        return (
+            ssh_config.ip,
+            ssh_config.port,
+            ssh_config.user,
+            hashlib.sha256(ssh_config.key.encode('utf-8')).hexdigest(),
+        )
+
+    @staticmethod
+    def _healthy(paramiko_ssh_client: paramiko.SSHClient) -> bool:
+        transport = paramiko_ssh_client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+
+        try:
+            # Fails if the connection has been dropped without the transport noticing
+            transport.send_ignore()
+        except (EOFError, OSError, paramiko.SSHException):
+            return False
+
+        return True
+
+    def _evict_idle(self):
+        """
+        Close connections which have been idle longer than the idle timeout.
+
+        Must be called while holding the lock.
+        """
+        time_now = time.monotonic()
+        for key_current, connection_current in list(self._connections.items()):
+            if (
+                connection_current.references == 0 and
+                connection_current.paramiko_ssh_client is not None and
+                time_now - connection_current.time_released > self._idle_timeout
+            ):
+                connection_current.paramiko_ssh_client.close()
+                del self._connections[key_current]
+
+    def acquire(self, *, ssh_config: SSHConfig) -> paramiko.SSHClient:
+        """
+        Obtain a connection to the instance, connecting only if no healthy connection is available.
+        """
+        key = SSHConnectionPool._key(ssh_config)
+
+        with self._lock:
+            self._evict_idle()
+
+            connection = self._connections.setdefault(key, _PooledConnection())
+            connection.references += 1
+
+        try:
+            # Connecting happens outside the pool lock, so connecting to one instance does not delay others
+            with connection.lock_connect:
+                if connection.paramiko_ssh_client is not None:
+                    if not SSHConnectionPool._healthy(connection.paramiko_ssh_client):
+                        connection.paramiko_ssh_client.close()
+                        connection.paramiko_ssh_client = None
+
+                if connection.paramiko_ssh_client is None:
+                    paramiko_ssh_client = _connect(ssh_config=ssh_config)
+                    paramiko_ssh_client.get_transport().set_keepalive(self._keepalive_interval)
+
+                    connection.paramiko_ssh_client = paramiko_ssh_client
+
+                return connection.paramiko_ssh_client
+        except Exception:
+            with self._lock:
+                connection.references -= 1
+            raise
+
+    def release(self, *, ssh_config: SSHConfig, paramiko_ssh_client: paramiko.SSHClient):
+        """
+        Return a connection to the pool.
+        """
+        key = SSHConnectionPool._key(ssh_config)
+
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is not None:
+                connection.references -= 1
+                connection.time_released = time.monotonic()
+
+            if connection is None or connection.paramiko_ssh_client is not paramiko_ssh_client:
+                # The connection was replaced or the pool was closed, so it is no longer shared
+                paramiko_ssh_client.close()
+
+            self._evict_idle()
+
+    def close(self):
+        """
+        Close all connections in the pool.
+        """
+        with self._lock:
+            for connection_current in self._connections.values():
+                if connection_current.paramiko_ssh_client is not None:
+                    connection_current.paramiko_ssh_client.close()
+
+            self._connections = {}
+
+
+# Pool used by every SSHClient within this process
+ssh_connection_pool = SSHConnectionPool()
+atexit.register(ssh_connection_pool.close)
+
+
 class SSHClientContextManager:
     """
     Context manager for connecting, using, and closing an SSH client.
@@ -151,8 +632,8 @@ class SSHClientContextManager:
 
     _ssh_client: SSHClient
 
-    def __init__(self, *, ssh_config: SSHConfig):
-        self._ssh_client = SSHClient(ssh_config=ssh_config)
+    def __init__(self, *, ssh_config: SSHConfig, pooled: bool = True):
+        self._ssh_client = SSHClient(ssh_config=ssh_config, pooled=pooled)
 
     def __enter__(self) -> SSHClient:
         self._ssh_client.open()
@@ -163,6 +644,192 @@ class SSHClientContextManager:
         self._ssh_client.close()
 
 
+def exec_command_fanout(
+    *,
+    ssh_configs: Dict[str, SSHConfig],
+    command: Union[str, List[str]],
+    max_workers: int = 8,
+    timeout: float = None,
+) -> Dict[str, Union[SSHCommandResult, Exception]]:
+    """
+    Execute a command on many instances concurrently, at most max_workers at a time.
+
+    Returns the result for each instance, keyed by the same names,
+    or the exception for any instance that could not be connected to or whose command timed out.
+    """
+
+    def exec_command_current(ssh_config_current: SSHConfig) -> SSHCommandResult:
+        with SSHClientContextManager(ssh_config=ssh_config_current) as ssh_client:
+            return ssh_client.exec_command_capture(command=command, timeout=timeout)
+
+    if not ssh_configs:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ssh_configs)))) as executor:
+        futures = {
+            name_current: executor.submit(exec_command_current, ssh_config_current)
+            for name_current, ssh_config_current in ssh_configs.items()
+        }
+
+        results = {}
+        for name_current, future_current in futures.items():
+            try:
+                results[name_current] = future_current.result()
+            except Exception as error:
+                results[name_current] = error
+
+        return results
+
+
+# Limits on a batch, which is sent as a single command.
+# A command is passed to the remote shell as one argument, limited by Linux to 128KiB (MAX_ARG_STRLEN)
+# including its terminating NUL, so commands are kept well below that limit.
+_SSH_BATCH_WRITE_MAX_BYTES = 64 * 1024
+_SSH_BATCH_COMMAND_MAX_BYTES = 100 * 1024
+_SSH_BATCH_PREFIX = 'set -e\n'
+
+
+def _command_bytes(command: str) -> int:
+    return len(command.encode('utf-8'))
+
+
+def _chunk_lines(*, prefix: List[str], lines: List[str], suffix: List[str], separator: str) -> List[str]:
+    """
+    Join lines into as few commands as possible, each with the prefix and suffix, so none exceeds a batch.
+    """
+
+    overhead = _command_bytes(separator.join(prefix + suffix)) + _command_bytes(separator) * 2
+    commands = []
+    lines_current = []
+    length_current = overhead
+    for line_current in lines:
+        length_line = _command_bytes(line_current) + _command_bytes(separator)
+        if lines_current and length_current + length_line > _SSH_BATCH_COMMAND_MAX_BYTES - len(_SSH_BATCH_PREFIX):
+            commands.append(separator.join(prefix + lines_current + suffix))
+            lines_current = []
+            length_current = overhead
+        lines_current.append(line_current)
+        length_current += length_line
+    if lines_current:
+        commands.append(separator.join(prefix + lines_current + suffix))
+
+    return commands
+
+
+class SSHBatch:
+    """
+    Remote operations gathered to be performed by a single command, in one round trip.
+
+    Operations are performed in order, stopping at the first which fails.
+    A batch which exceeds the length of a single command is performed in as few commands as possible.
+    """
+
+    _commands: List[str]
+    _mkdir_paths: Optional[List[Union[PurePosixPath, str]]]  # Paths of consecutive directory creations, combined into few commands
+    _mkdir_start: int  # Index of the first command creating those directories
+
+    def __init__(self):
+        self._commands = []
+        self._mkdir_paths = None
+        self._mkdir_start = 0
+
+    def _append(self, command: str):
+        self._mkdir_paths = None
+        self._commands.append(command)
+
+    @staticmethod
+    def _path_commands(command: str, paths: List[Union[PurePosixPath, str]]) -> List[str]:
+        return _chunk_lines(
+            prefix=[command, '--'],
+            lines=[shlex.quote(PurePosixPath(path_current).as_posix()) for path_current in paths],
+            suffix=[],
+            separator=' ',
+        )
+
+    def mkdir(self, *paths: Union[PurePosixPath, str]) -> 'SSHBatch':
+        """
+        Create directories, including any parents.
+        """
+        if self._mkdir_paths is None:
+            self._mkdir_paths = []
+            self._mkdir_start = len(self._commands)
+        self._mkdir_paths.extend(paths)
+        self._commands[self._mkdir_start:] = self._path_commands('mkdir -p', self._mkdir_paths)
+
+        return self
+
+    def remove(self, *paths: Union[PurePosixPath, str]) -> 'SSHBatch':
+        """
+        Remove files or directories, including their contents.
+        """
+        self._mkdir_paths = None
+        self._commands.extend(self._path_commands('rm -rf', paths))
+
+        return self
+
+    def write_file(self, *, path: Union[PurePosixPath, str], content: Union[bytes, str]) -> 'SSHBatch':
+        """
+        Write a small file, which is replaced in place so it is never observed partially written.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if len(content) > _SSH_BATCH_WRITE_MAX_BYTES:
+            raise ValueError('File too large to write in a batch: {}'.format(path))
+
+        path = PurePosixPath(path).as_posix()
+        path_partial = '{}{}'.format(path, _SFTP_PARTIAL_SUFFIX)
+        self._append('printf %s {} | base64 -d > {} && mv -f -- {} {}'.format(
+            base64.b64encode(content).decode('ascii'),
+            shlex.quote(path_partial),
+            shlex.quote(path_partial),
+            shlex.quote(path),
+        ))
+
+        return self
+
+    def command(self, command: str) -> 'SSHBatch':
+        """
+        Execute a command.
+
+        Raises ValueError if the command alone exceeds the length of a batch.
+        """
+        if _command_bytes(_SSH_BATCH_PREFIX + command) > _SSH_BATCH_COMMAND_MAX_BYTES:
+            raise ValueError('Command too large for a batch: {}...'.format(command[:80]))
+        self._append(command)
+
+        return self
+
+    def _scripts(self) -> List[str]:
+        return [
+            _SSH_BATCH_PREFIX + script_current
+            for script_current in _chunk_lines(prefix=[], lines=self._commands, suffix=[], separator='\n')
+        ]
+
+    def execute(
+        self,
+        *,
+        ssh_client: SSHClient,
+        timeout: float = None,
+        check: bool = True,
+    ) -> List[SSHCommandResult]:
+        """
+        Perform the operations, returning the result of each command that was executed.
+
+        If check, raises SSHCommandError if any operation fails.
+        """
+        results = []
+        for script_current in self._scripts():
+            result = ssh_client.exec_command(command=script_current, echo=False, timeout=timeout, check=check)
+            results.append(result)
+            if result.exit_status != 0:
+                break
+
+        return results
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+
 class SFTPClient:
     """
     Context manager for connecting, using, and destroying an SFTP client.
@@ -212,108 +879,1139 @@ class SFTPClientContextManager:
         self._sftp_client.close()
 
 
-class SSHPortForward:
+@dataclass(frozen=True)
+class SFTPSyncResult:
     """
-    Forward a port through an ssh client.
+    Result of synchronizing files to a remote directory.
     """
 
-    _ssh_client: SSHClient
-    _remote_host: str
-    _remote_port: int
-    _requested_local_port: int
+    uploaded: List[str]
+    skipped: List[str]  # Already matched the local file
+    removed: List[str]  # Not among the files, removed if pruning
+    bytes_uploaded: int
+    duration: float  # Seconds
+
+
+# Suffix of a file while it is being uploaded, allowing an interrupted upload to be resumed
+_SFTP_PARTIAL_SUFFIX = '.partial'
+
+# Files up to this size are written in a batch rather than uploaded through SFTP
+_SFTP_SYNC_BATCH_MAX_BYTES = 16 * 1024
+
+
+def _sha256_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, mode='rb') as file_current:
+        for chunk in iter(lambda: file_current.read(1024 * 1024), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def _remote_matches_commands(
+    *,
+    remote_dir: PurePosixPath,
+    local_sizes: Dict[str, int],
+) -> List[str]:
+    """
+    Commands printing the hash of each remote file whose size matches its local file.
+
+    Files are only hashed if their size matches, so a changed file is usually not read at all.
+    A file which cannot be hashed (e.g., no sha256sum) is printed without a hash, so it will not match.
+    Many files are checked in several commands, so none exceeds the length of a batch.
+    """
+
+    return _chunk_lines(
+        prefix=[
+            '(',
+            'cd {}'.format(shlex.quote(remote_dir.as_posix())),
+            'check() { if [ -f "$2" ] && [ "$(stat -c %s "$2")" = "$1" ]; then echo "$(sha256sum < "$2" | cut -c 1-64) $2"; fi; }',
+        ],
+        lines=[
+            'check {} {}'.format(size_current, shlex.quote(path_current))
+            for path_current, size_current in local_sizes.items()
+        ],
+        suffix=[
+            ')',
+        ],
+        separator='\n',
+    )
+
+
+def _parse_remote_matches(stdout: str) -> Dict[str, str]:
+    remote_hashes = {}
+    for line_current in stdout.splitlines():
+        hash_current, _, path_current = line_current.partition(' ')
+        remote_hashes[path_current] = hash_current
+
+    return remote_hashes
+
+
+def _sftp_upload(
+    *,
+    paramiko_sftp_client: paramiko.SFTPClient,
+    local_path: Path,
+    remote_path: str,
+    local_sha256: str = None,  # Hash of the local file, if already known
+) -> int:
+    """
+    Upload a file, resuming any previously interrupted upload, returning the number of bytes sent.
+
+    The file is written under a temporary name and then renamed into place,
+    so the remote file is never observed partially written.
+    The temporary name includes a hash of the local file,
+    so an upload is only resumed if it was of the same content.
+    """
+
+    local_sha256 = local_sha256 or _sha256_file(local_path)
+    remote_path_partial = '{}.{}{}'.format(remote_path, local_sha256[:16], _SFTP_PARTIAL_SUFFIX)
+    local_size = local_path.stat().st_size
+
+    offset = 0
+    try:
+        offset = paramiko_sftp_client.stat(remote_path_partial).st_size
+    except FileNotFoundError:
+        pass
+    if offset > local_size:
+        offset = 0
+
+    sent = 0
+    with open(local_path, mode='rb') as file_local:
+        file_local.seek(offset)
+        with paramiko_sftp_client.open(remote_path_partial, mode='ab' if offset else 'wb') as file_remote:
+            # Do not wait for each write to be acknowledged before sending the next
+            file_remote.set_pipelined(True)
+            for chunk in iter(lambda: file_local.read(32 * 1024), b''):
+                file_remote.write(chunk)
+                sent += len(chunk)
+
+    paramiko_sftp_client.posix_rename(remote_path_partial, remote_path)
+
+    return sent
+
+
+def sftp_sync(
+    *,
+    ssh_client: SSHClient,
+    remote_dir: Union[PurePosixPath, str],
+    files: Dict[str, Union[Path, str]],  # Each remote path, relative to remote_dir, maps to its local file
+    max_workers: int = 4,
+    prune: bool = False,
+) -> SFTPSyncResult:
+    """
+    Upload files to a remote directory, skipping any whose remote size and hash already match.
+
+    Remote directories are created and remote files are checked in a single batch.
+    Small files are then written in a single batch, and other files are uploaded concurrently,
+    each worker using its own SFTP session on the same connection.
+    An upload which was interrupted is resumed from where it stopped.
+
+    If prune, any other remote file in the directory is then removed,
+    so the directory contains only the files.
+    """
+
+    time_start = time.monotonic()
+
+    remote_dir = PurePosixPath(remote_dir)
+    files = {
+        PurePosixPath(remote_path_current).as_posix(): Path(local_path_current)
+        for remote_path_current, local_path_current in files.items()
+    }
+
+    # Create every remote directory and check every remote file at once
+    local_sizes = {
+        remote_path_current: local_path_current.stat().st_size
+        for remote_path_current, local_path_current in files.items()
+    }
+    batch = SSHBatch()
+    batch.mkdir(remote_dir, *sorted({
+        (remote_dir / remote_path_current).parent
+        for remote_path_current in files.keys()
+    }))
+    for command_current in _remote_matches_commands(remote_dir=remote_dir, local_sizes=local_sizes):
+        batch.command(command_current)
+    remote_hashes = _parse_remote_matches(''.join(
+        result_current.stdout for result_current in batch.execute(ssh_client=ssh_client)
+    ))
+
+    # Skip files which already match
+    skipped = []
+    pending = []
+    local_hashes = {}
+    for remote_path_current, local_path_current in files.items():
+        if remote_path_current in remote_hashes:
+            local_hashes[remote_path_current] = _sha256_file(local_path_current)
+            if remote_hashes[remote_path_current] == local_hashes[remote_path_current]:
+                skipped.append(remote_path_current)
+                continue
+
+        pending.append(remote_path_current)
+
+    # Write small files at once, rather than each in its own SFTP round trips
+    bytes_uploaded = 0
+    batch = SSHBatch()
+    pending_sftp = []
+    for remote_path_current in pending:
+        if local_sizes[remote_path_current] <= _SFTP_SYNC_BATCH_MAX_BYTES:
+            batch.write_file(
+                path=remote_dir / remote_path_current,
+                content=files[remote_path_current].read_bytes(),
+            )
+            bytes_uploaded += local_sizes[remote_path_current]
+        else:
+            pending_sftp.append(remote_path_current)
+    if len(batch):
+        batch.execute(ssh_client=ssh_client)
+
+    if pending_sftp:
+        # SFTP sessions are not shared between threads, so each worker uses its own
+        sessions = queue.Queue()
+        workers = max(1, min(max_workers, len(pending_sftp)))
+
+        def upload(remote_path_current: str) -> int:
+            paramiko_sftp_client = sessions.get()
+            try:
+                return _sftp_upload(
+                    paramiko_sftp_client=paramiko_sftp_client,
+                    local_path=files[remote_path_current],
+                    remote_path=(remote_dir / remote_path_current).as_posix(),
+                    local_sha256=local_hashes.get(remote_path_current),
+                )
+            finally:
+                sessions.put(paramiko_sftp_client)
+
+        try:
+            for _ in range(workers):
+                sessions.put(ssh_client.paramiko_ssh_client.open_sftp())
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                bytes_uploaded += sum(executor.map(upload, pending_sftp))
+        finally:
+            while not sessions.empty():
+                sessions.get().close()
+
+    removed = []
+    if prune:
+        result = ssh_client.exec_command(
+            command='cd {} && find . -type f'.format(shlex.quote(remote_dir.as_posix())),
+            echo=False,
+            check=True,
+        )
+        removed = sorted(
+            remote_path_current
+            for remote_path_current in (
+                PurePosixPath(line_current).as_posix()
+                for line_current in result.stdout.splitlines()
+                if line_current
+            )
+            if remote_path_current not in files
+        )
+
+        batch = SSHBatch()
+        if removed:
+            batch.remove(*[remote_dir / remote_path_current for remote_path_current in removed])
+        batch.command('find {} -mindepth 1 -type d -empty -delete'.format(shlex.quote(remote_dir.as_posix())))
+        batch.execute(ssh_client=ssh_client)
+
+    return SFTPSyncResult(
+        uploaded=pending,
+        skipped=skipped,
+        removed=removed,
+        bytes_uploaded=bytes_uploaded,
+        duration=time.monotonic() - time_start,
+    )
+
+
+@dataclass(frozen=True)
+class SSHPortForwardSpec:
+    """
+    A port to forward from a remote host.
+    """
+
+    remote_port: int
+    remote_host: str = 'localhost'
+    local_port: int = 0  # If 0, an open port is automatically chosen
+
+    @staticmethod
+    def parse(spec: str) -> 'SSHPortForwardSpec':
+        """
+        Parse a spec of the form '[[local_port:]remote_host:]remote_port'.
+
+        As with the port forward task, the local port defaults to the remote port.
+        """
+
+        parts = spec.split(':')
+        try:
+            if len(parts) == 1:
+                return SSHPortForwardSpec(remote_port=int(parts[0]), local_port=int(parts[0]))
+            if len(parts) == 2:
+                return SSHPortForwardSpec(remote_host=parts[0], remote_port=int(parts[1]), local_port=int(parts[1]))
+            if len(parts) == 3:
+                return SSHPortForwardSpec(local_port=int(parts[0]), remote_host=parts[1], remote_port=int(parts[2]))
+        except ValueError:
+            pass
+
+        raise ValueError('Invalid port forward: {}'.format(spec))
+
+
+@dataclass
+class SSHPortForwardCounters:
+    """
+    Counters of a forwarded port, updated as connections are served.
+    """
+
+    connections: int = 0
+    connections_active: int = 0
+    connections_failed: int = 0  # The remote host could not be reached
+    bytes_sent: int = 0  # From local connections to the remote host
+    bytes_received: int = 0  # From the remote host to local connections
+
+
+class _LatencyHistogram:
+    """
+    Histogram of durations, in buckets of increasing width.
+    """
+
+    # Upper bound of each bucket in seconds, followed by an unbounded bucket
+    _BOUNDS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0]
+
+    counts: List[int]
+    count: int
+    total: float
+    maximum: float
+
+    def __init__(self):
+        self.counts = [0] * (len(self._BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect.bisect_left(self._BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """
+        Upper bound of the bucket containing the given fraction of durations, or None if none were recorded.
+        """
+
+        if not self.count:
+            return None
+
+        threshold = fraction * self.count
+        cumulative = 0
+        for index_current, count_current in enumerate(self.counts):
+            cumulative += count_current
+            if cumulative >= threshold:
+                if index_current < len(self._BOUNDS):
+                    return min(self._BOUNDS[index_current], self.maximum)
+                break
+
+        return self.maximum
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.maximum if self.count else None,
+            'buckets': [
+                {
+                    'le': self._BOUNDS[index_current] if index_current < len(self._BOUNDS) else None,
+                    'count': count_current,
+                }
+                for index_current, count_current in enumerate(self.counts)
+                if count_current
+            ],
+        }
+
+
+class SSHPortForwardInstrumentation:
+    """
+    Measurements of the connections through a forwarded port.
+
+    Channel open latency is the time from accepting a local connection until the remote host is reached,
+    so it reflects the tunnel. First response latency is the time from first sending data to the remote
+    until first receiving data from it, so it reflects the remote service plus one round trip of the tunnel.
+    """
+
+    channel_open_latency: _LatencyHistogram
+    first_response_latency: _LatencyHistogram
+    connection_lifetime: _LatencyHistogram
+    concurrent_peak: int
 
-    _server: Optional[socketserver.ThreadingTCPServer]
+    _connections: collections.deque
+    _lock: threading.Lock
+
+    def __init__(self, *, max_connections: int = 1000):
+        self.channel_open_latency = _LatencyHistogram()
+        self.first_response_latency = _LatencyHistogram()
+        self.connection_lifetime = _LatencyHistogram()
+        self.concurrent_peak = 0
+
+        # Only the most recent connections are retained
+        self._connections = collections.deque(maxlen=max_connections)
+        self._lock = threading.Lock()
+
+    def record_open(self, *, latency: float, concurrent: int):
+        with self._lock:
+            self.channel_open_latency.record(latency)
+            self.concurrent_peak = max(self.concurrent_peak, concurrent)
+
+    def record_first_response(self, *, latency: float):
+        with self._lock:
+            self.first_response_latency.record(latency)
+
+    def record_close(
+        self,
+        *,
+        lifetime: float,
+        channel_open_latency: float,
+        first_response_latency: Optional[float],
+        bytes_sent: int,
+        bytes_received: int,
+    ):
+        with self._lock:
+            self.connection_lifetime.record(lifetime)
+            self._connections.append({
+                'lifetime': lifetime,
+                'channel_open_latency': channel_open_latency,
+                'first_response_latency': first_response_latency,
+                'bytes_sent': bytes_sent,
+                'bytes_received': bytes_received,
+            })
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'concurrent_peak': self.concurrent_peak,
+                'channel_open_latency': self.channel_open_latency.to_dict(),
+                'first_response_latency': self.first_response_latency.to_dict(),
+                'connection_lifetime': self.connection_lifetime.to_dict(),
+                'connections': list(self._connections),
+            }
+
+
+class _PortForwardListener:
+    """
+    A listening local socket and the remote host and port its connections are forwarded to.
+    """
+
+    server_socket: socket.socket
+    remote_host: str
+    remote_port: int
+    counters: SSHPortForwardCounters
+    instrumentation: Optional[SSHPortForwardInstrumentation]
 
     def __init__(
         self,
         *,
-        ssh_client: SSHClient,
+        server_socket: socket.socket,
         remote_host: str,
         remote_port: int,
-        local_port: int = 0,
+        instrumentation: SSHPortForwardInstrumentation = None,
     ):
-        self._ssh_client = ssh_client
-        self._remote_host = remote_host
-        self._remote_port = remote_port
-        self._requested_local_port = local_port
-
-        self._server = None
-
-    def _create_handler(self, ssh_client: SSHClient, remote_host: str, remote_port: int):
-        class Handler(socketserver.BaseRequestHandler):
-            _ssh_client: SSHClient = ssh_client
-            _remote_port: int = remote_port
-
-            def handle(self):
-                channel = self._ssh_client.paramiko_ssh_client.get_transport().open_channel(
-                    kind='direct-tcpip',
-                    dest_addr=(remote_host, remote_port),
-                    src_addr=self.request.getpeername(),
-                )
+        self.server_socket = server_socket
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.counters = SSHPortForwardCounters()
+        self.instrumentation = instrumentation
+
+
+class _ForwardedConnection:
+    """
+    A local connection and the channel it is forwarded through, with data pending in each direction.
+    """
+
+    listener: _PortForwardListener
+    sock: socket.socket
+    channel: paramiko.Channel
 
-                while True:
-                    # If either direction has data available, forward that data.
-                    # Important to read small amounts of data on each recv,
-                    # as a large read from recv can cause failures
-                    # (perhaps related to underlying Transport window_size).
-                    r, w, x = select.select([self.request, channel], [], [])
-                    if self.request in r:
-                        data = self.request.recv(1024)
-                        if len(data) == 0:
-                            break
-                        channel.send(data)
-                    if channel in r:
-                        data = channel.recv(1024)
-                        if len(data) == 0:
-                            break
-                        self.request.send(data)
+    pending_to_channel: bytearray
+    pending_to_sock: bytearray
 
+    sock_eof: bool
+    channel_eof: bool
+    channel_shutdown: bool
+    sock_shutdown: bool
+
+    events_sock: int
+    events_channel: int
+
+    time_accepted: float
+    channel_open_latency: float
+    time_first_sent: Optional[float]
+    first_response_latency: Optional[float]
+    bytes_sent: int
+    bytes_received: int
+
+    def __init__(
+        self,
+        *,
+        listener: _PortForwardListener,
+        sock: socket.socket,
+        channel: paramiko.Channel,
+        time_accepted: float,
+        channel_open_latency: float,
+    ):
+        self.listener = listener
+        self.sock = sock
+        self.channel = channel
+
+        self.pending_to_channel = bytearray()
+        self.pending_to_sock = bytearray()
+
+        self.sock_eof = False
+        self.channel_eof = False
+        self.channel_shutdown = False
+        self.sock_shutdown = False
+
+        self.events_sock = 0
+        self.events_channel = 0
+
+        self.time_accepted = time_accepted
+        self.channel_open_latency = channel_open_latency
+        self.time_first_sent = None
+        self.first_response_latency = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def done(self) -> bool:
+        # Each direction is done once its end of file has been forwarded
+        return self.channel_shutdown and self.sock_shutdown
+
+
+class _PortForwardEngine:
+    """
+    Event loop which forwards every accepted connection through a channel of an SSH transport.
+
+    Any number of listening sockets share the loop, each forwarding to its own remote host and port.
+    All connections are served by a single thread using non-blocking sockets and channels.
+    Each direction buffers at most buffer_size bytes, reading more only as the other side accepts data,
+    so a slow reader applies backpressure rather than growing memory or stalling other connections.
+    Channels are opened by a small pool of workers, so a slow channel open does not stall the loop.
+    End of file is forwarded separately in each direction, so half-closed connections behave correctly.
+    """
+
+    _transport: paramiko.Transport
+    _listeners: List[_PortForwardListener]
+    _buffer_size: int
+
+    _selector: selectors.BaseSelector
+    _executor: concurrent.futures.ThreadPoolExecutor
+    _wake_read: socket.socket
+    _wake_write: socket.socket
+    _opened: List[tuple]
+    _lock_opened: threading.Lock
+    _closed: bool  # Once closed, channels which finish opening are closed rather than handed to the loop
+    _connections: List[_ForwardedConnection]
+    _stopping: bool
+
+    def __init__(
+        self,
+        *,
+        transport: paramiko.Transport,
+        listeners: List[_PortForwardListener],
+        buffer_size: int = 256 * 1024,
+    ):
+        self._transport = transport
+        self._listeners = listeners
+        self._buffer_size = buffer_size
+
+        self._selector = selectors.DefaultSelector()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._wake_read.setblocking(False)
+        self._opened = []
+        self._lock_opened = threading.Lock()
+        self._closed = False
+        self._connections = []
+        self._stopping = False
+
+    def _wake(self):
+        try:
+            self._wake_write.send(b'\0')
+        except OSError:
+            pass
+
+    def _open_channel(self, listener: _PortForwardListener, sock: socket.socket, time_accepted: float):
+        """
+        Open the channel for an accepted connection, then hand both back to the loop.
+        """
+        try:
+            channel = self._transport.open_channel(
+                kind='direct-tcpip',
+                dest_addr=(listener.remote_host, listener.remote_port),
+                src_addr=sock.getpeername(),
+            )
+        except Exception as error:
+            channel = error
+
+        with self._lock_opened:
+            if not self._closed:
+                self._opened.append((listener, sock, channel, time_accepted, time.monotonic() - time_accepted))
+                channel = None
+        if channel is not None:
+            # The loop has exited, so the connection will never be forwarded
+            if not isinstance(channel, Exception):
                 channel.close()
-                self.request.close()
+            sock.close()
+            return
+
+        self._wake()
+
+    def _accept(self, listener: _PortForwardListener):
+        try:
+            sock, _ = listener.server_socket.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._executor.submit(self._open_channel, listener, sock, time.monotonic())
+
+    def _register_opened(self):
+        try:
+            while self._wake_read.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        with self._lock_opened:
+            opened = self._opened
+            self._opened = []
+
+        for listener, sock, channel, time_accepted, channel_open_latency in opened:
+            if isinstance(channel, Exception):
+                print('Port forward failed to open channel to {}:{}: {}'.format(listener.remote_host, listener.remote_port, channel))
+                listener.counters.connections_failed += 1
+                sock.close()
+                continue
+
+            sock.setblocking(False)
+            channel.settimeout(0.0)
+            self._connections.append(_ForwardedConnection(
+                listener=listener,
+                sock=sock,
+                channel=channel,
+                time_accepted=time_accepted,
+                channel_open_latency=channel_open_latency,
+            ))
+            listener.counters.connections += 1
+            listener.counters.connections_active += 1
+            if listener.instrumentation is not None:
+                listener.instrumentation.record_open(
+                    latency=channel_open_latency,
+                    concurrent=listener.counters.connections_active,
+                )
 
-        return Handler
+    def _close(self, connection: _ForwardedConnection):
+        for events, fileobj in [(connection.events_sock, connection.sock), (connection.events_channel, connection.channel)]:
+            if events:
+                self._selector.unregister(fileobj)
+        connection.events_sock = 0
+        connection.events_channel = 0
+
+        connection.channel.close()
+        connection.sock.close()
+
+        connection.listener.counters.connections_active -= 1
+        if connection.listener.instrumentation is not None:
+            connection.listener.instrumentation.record_close(
+                lifetime=time.monotonic() - connection.time_accepted,
+                channel_open_latency=connection.channel_open_latency,
+                first_response_latency=connection.first_response_latency,
+                bytes_sent=connection.bytes_sent,
+                bytes_received=connection.bytes_received,
+            )
+
+    def _pump(self, connection: _ForwardedConnection):
+        """
+        Move as much data as possible in each direction without blocking.
+        """
+
+        # Local socket to channel
+        if not connection.sock_eof and len(connection.pending_to_channel) < self._buffer_size:
+            try:
+                data = connection.sock.recv(self._buffer_size - len(connection.pending_to_channel))
+                if data:
+                    connection.pending_to_channel += data
+                else:
+                    connection.sock_eof = True
+            except (BlockingIOError, InterruptedError):
+                pass
+        while connection.pending_to_channel and connection.channel.send_ready():
+            try:
+                sent = connection.channel.send(connection.pending_to_channel)
+            except socket.timeout:
+                break
+            if sent <= 0:
+                break
+            del connection.pending_to_channel[:sent]
+            connection.listener.counters.bytes_sent += sent
+            connection.bytes_sent += sent
+            if connection.time_first_sent is None:
+                connection.time_first_sent = time.monotonic()
+        if connection.sock_eof and not connection.pending_to_channel and not connection.channel_shutdown:
+            connection.channel.shutdown_write()
+            connection.channel_shutdown = True
+
+        # Channel to local socket
+        if not connection.channel_eof and len(connection.pending_to_sock) < self._buffer_size:
+            try:
+                data = connection.channel.recv(self._buffer_size - len(connection.pending_to_sock))
+                if data:
+                    connection.pending_to_sock += data
+                    if connection.first_response_latency is None and connection.time_first_sent is not None:
+                        connection.first_response_latency = time.monotonic() - connection.time_first_sent
+                        if connection.listener.instrumentation is not None:
+                            connection.listener.instrumentation.record_first_response(
+                                latency=connection.first_response_latency,
+                            )
+                else:
+                    connection.channel_eof = True
+            except socket.timeout:
+                pass
+        if connection.pending_to_sock:
+            try:
+                sent = connection.sock.send(connection.pending_to_sock)
+                del connection.pending_to_sock[:sent]
+                connection.listener.counters.bytes_received += sent
+                connection.bytes_received += sent
+            except (BlockingIOError, InterruptedError):
+                pass
+        if connection.channel_eof and not connection.pending_to_sock and not connection.sock_shutdown:
+            connection.sock.shutdown(socket.SHUT_WR)
+            connection.sock_shutdown = True
+
+        # A remote that closed the entire channel will send nothing further
+        if connection.channel.closed and not connection.pending_to_sock:
+            connection.channel_eof = True
+            connection.channel_shutdown = True
+            if not connection.sock_shutdown:
+                connection.sock.shutdown(socket.SHUT_WR)
+                connection.sock_shutdown = True
+
+    def _update_interest(self, connection: _ForwardedConnection):
+        """
+        Register interest in only those events which can currently make progress.
+        """
+
+        events_sock = 0
+        if not connection.sock_eof and len(connection.pending_to_channel) < self._buffer_size:
+            events_sock |= selectors.EVENT_READ
+        if connection.pending_to_sock:
+            events_sock |= selectors.EVENT_WRITE
+
+        events_channel = 0
+        if not connection.channel_eof and len(connection.pending_to_sock) < self._buffer_size:
+            events_channel |= selectors.EVENT_READ
+
+        for attribute, fileobj, events in [
+            ('events_sock', connection.sock, events_sock),
+            ('events_channel', connection.channel, events_channel),
+        ]:
+            events_current = getattr(connection, attribute)
+            if events == events_current:
+                continue
+
+            if not events_current:
+                self._selector.register(fileobj, events, connection)
+            elif not events:
+                self._selector.unregister(fileobj)
+            else:
+                self._selector.modify(fileobj, events, connection)
+
+            setattr(connection, attribute, events)
+
+    def run(self):
+        """
+        Forward connections until stopped.
+        """
+
+        for listener_current in self._listeners:
+            listener_current.server_socket.setblocking(False)
+            self._selector.register(listener_current.server_socket, selectors.EVENT_READ, listener_current)
+        self._selector.register(self._wake_read, selectors.EVENT_READ, 'wake')
+
+        try:
+            while not self._stopping:
+                # Writes to a channel cannot be selected on, as they depend on the remote window.
+                # While any are waiting, poll briefly instead of blocking.
+                timeout = None
+                if any(connection_current.pending_to_channel for connection_current in self._connections):
+                    timeout = 0.005
+
+                ready = self._selector.select(timeout=timeout)
+
+                connections_ready = set()
+                for key_current, _ in ready:
+                    if isinstance(key_current.data, _PortForwardListener):
+                        self._accept(key_current.data)
+                    elif key_current.data == 'wake':
+                        self._register_opened()
+                    else:
+                        connections_ready.add(id(key_current.data))
+
+                for connection_current in list(self._connections):
+                    if id(connection_current) not in connections_ready and not connection_current.pending_to_channel:
+                        if connection_current.events_sock or connection_current.events_channel:
+                            continue
+
+                    try:
+                        self._pump(connection_current)
+                    except (OSError, EOFError, paramiko.SSHException):
+                        # Either side failed, so the connection cannot continue
+                        connection_current.channel_shutdown = True
+                        connection_current.sock_shutdown = True
+
+                    if connection_current.done:
+                        self._close(connection_current)
+                        self._connections.remove(connection_current)
+                    else:
+                        self._update_interest(connection_current)
+        finally:
+            for connection_current in self._connections:
+                self._close(connection_current)
+            self._connections = []
+
+            # Close connections whose channels opened but were not yet handed to the loop.
+            # Any still opening are closed by their worker once they finish.
+            with self._lock_opened:
+                self._closed = True
+                opened = self._opened
+                self._opened = []
+            for _, sock, channel, _, _ in opened:
+                if not isinstance(channel, Exception):
+                    channel.close()
+                sock.close()
+
+            self._selector.close()
+            self._executor.shutdown(wait=False)
+            self._wake_read.close()
+            self._wake_write.close()
+            for listener_current in self._listeners:
+                listener_current.server_socket.close()
+
+    def stop(self):
+        """
+        Stop forwarding, closing all connections.
+        """
+        self._stopping = True
+        self._wake()
+
+
+def _format_seconds(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '-'
+    if seconds < 1.0:
+        return '{:.1f}ms'.format(seconds * 1000)
+    return '{:.2f}s'.format(seconds)
+
+
+class SSHMultiPortForward:
+    """
+    Forward many ports through an ssh client, sharing its connection.
+
+    If instrumented, connection timings are recorded for each forward.
+    These can be printed as a periodic stats line and written as JSON when the forward is closed.
+    """
+
+    _ssh_client: SSHClient
+    _specs: List[SSHPortForwardSpec]
+    _instrument: bool
+    _stats_interval: Optional[float]
+    _stats_path: Optional[Path]
+
+    _engine: Optional[_PortForwardEngine]
+    _thread: Optional[threading.Thread]
+    _listeners: List[_PortForwardListener]
+    _local_ports: List[int]
+    _time_opened: Optional[float]
+    _stats_thread: Optional[threading.Thread]
+    _stats_stop: threading.Event
+
+    def __init__(
+        self,
+        *,
+        ssh_client: SSHClient,
+        specs: List[SSHPortForwardSpec],
+        instrument: bool = False,
+        stats_interval: float = None,  # Seconds between stats lines, implies instrument
+        stats_path: Union[Path, str] = None,  # File to write stats as JSON when closed, implies instrument
+    ):
+        self._ssh_client = ssh_client
+        self._specs = list(specs)
+        self._stats_interval = stats_interval
+        self._stats_path = Path(stats_path) if stats_path is not None else None
+        self._instrument = instrument or stats_interval is not None or stats_path is not None
+
+        self._engine = None
+        self._thread = None
+        self._listeners = []
+        self._local_ports = []
+        self._time_opened = None
+        self._stats_thread = None
+        self._stats_stop = threading.Event()
 
     def serve_forever(self):
         """
-        Forward incoming requests forever.
+        Forward incoming requests until closed.
         """
-        self._server.serve_forever()
+        # Wait in intervals, so an interrupt can be delivered on all platforms
+        while self._thread is not None and self._thread.is_alive():
+            self._thread.join(0.5)
 
     def open(self):
         """
         Start the port forwarding server.
         """
-        self._server = socketserver.ThreadingTCPServer(
-            server_address=('127.0.0.1', self._requested_local_port),
-            RequestHandlerClass=self._create_handler(self._ssh_client, self._remote_host, self._remote_port),
+        listeners = []
+        try:
+            for spec_current in self._specs:
+                server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                listeners.append(_PortForwardListener(
+                    server_socket=server_socket,
+                    remote_host=spec_current.remote_host,
+                    remote_port=spec_current.remote_port,
+                    instrumentation=SSHPortForwardInstrumentation() if self._instrument else None,
+                ))
+                server_socket.bind(('127.0.0.1', spec_current.local_port))
+                server_socket.listen(socket.SOMAXCONN)
+        except OSError:
+            for listener_current in listeners:
+                listener_current.server_socket.close()
+            raise
+        self._listeners = listeners
+
+        # Obtain ports from the server sockets,
+        # so that providing local port of 0 allows automatically choosing an open port
+        self._local_ports = [listener_current.server_socket.getsockname()[1] for listener_current in listeners]
+
+        self._engine = _PortForwardEngine(
+            transport=self._ssh_client.paramiko_ssh_client.get_transport(),
+            listeners=self._listeners,
         )
 
-        threading.Thread(target=self.serve_forever).start()
+        self._time_opened = time.monotonic()
+        self._thread = threading.Thread(target=self._engine.run, daemon=True)
+        self._thread.start()
 
-        print('Forwarding local port {} to remote {}:{}'.format(self.local_port, self.remote_host, self.remote_port))
+        for local_port_current, spec_current in zip(self.local_ports, self._specs):
+            print('Forwarding local port {} to remote {}:{}'.format(local_port_current, spec_current.remote_host, spec_current.remote_port))
+
+        if self._stats_interval is not None:
+            self._stats_stop.clear()
+            self._stats_thread = threading.Thread(target=self._print_stats_periodically, daemon=True)
+            self._stats_thread.start()
 
     def close(self):
         """
         Stop the port forwarding server.
         """
-        self._server.shutdown()
-        self._server = None
+        self._engine.stop()
+        self._thread.join()
+
+        if self._stats_thread is not None:
+            self._stats_stop.set()
+            self._stats_thread.join()
+            self._stats_thread = None
+
+        if self._stats_path is not None:
+            self._write_stats()
+
+        self._engine = None
+        self._thread = None
+
+    def _print_stats_periodically(self):
+        while not self._stats_stop.wait(self._stats_interval):
+            self.print_stats()
+
+    def print_stats(self):
+        """
+        Print a line of stats for each forward.
+        """
+        for local_port_current, listener_current in zip(self._local_ports, self._listeners):
+            counters = listener_current.counters
+            line = 'Forward {} to {}:{}: {} active, {} total, {} failed, {} bytes sent, {} bytes received'.format(
+                local_port_current,
+                listener_current.remote_host,
+                listener_current.remote_port,
+                counters.connections_active,
+                counters.connections,
+                counters.connections_failed,
+                counters.bytes_sent,
+                counters.bytes_received,
+            )
+
+            if listener_current.instrumentation is not None:
+                stats = listener_current.instrumentation.to_dict()
+                line = '{}, peak {} active, channel open p50 {} p99 {}, first response p50 {} p99 {}'.format(
+                    line,
+                    stats['concurrent_peak'],
+                    _format_seconds(stats['channel_open_latency']['p50']),
+                    _format_seconds(stats['channel_open_latency']['p99']),
+                    _format_seconds(stats['first_response_latency']['p50']),
+                    _format_seconds(stats['first_response_latency']['p99']),
+                )
+
+            print(line, flush=True)
+
+    def stats(self) -> Dict:
+        """
+        Counters of each forward, including timings if instrumented.
+        """
+        return {
+            'duration': time.monotonic() - self._time_opened if self._time_opened is not None else None,
+            'forwards': [
+                dict(
+                    {
+                        'local_port': local_port_current,
+                        'remote_host': listener_current.remote_host,
+                        'remote_port': listener_current.remote_port,
+                        'counters': asdict(listener_current.counters),
+                    },
+                    **(listener_current.instrumentation.to_dict() if listener_current.instrumentation is not None else {})
+                )
+                for local_port_current, listener_current in zip(self._local_ports, self._listeners)
+            ],
+        }
+
+    def _write_stats(self):
+        # A reader never observes partial stats
+        aws_infrastructure.tasks.files.write_file_atomic(
+            path=self._stats_path,
+            content=json.dumps(self.stats(), indent=2),
+        )
+
+        print('Port forward stats written to: {}'.format(self._stats_path))
+
+    @property
+    def specs(self) -> List[SSHPortForwardSpec]:
+        return list(self._specs)
+
+    @property
+    def local_ports(self) -> List[int]:
+        return list(self._local_ports)
+
+    @property
+    def counters(self) -> List[SSHPortForwardCounters]:
+        return [listener_current.counters for listener_current in self._listeners]
+
+
+class SSHMultiPortForwardContextManager:
+    """
+    Context manager for connecting, using, and closing a forward of many ports.
+    """
+
+    _ssh_multi_port_forward: SSHMultiPortForward
+
+    def __init__(
+        self,
+        *,
+        ssh_client: SSHClient,
+        specs: List[SSHPortForwardSpec],
+        instrument: bool = False,
+        stats_interval: float = None,
+        stats_path: Union[Path, str] = None,
+    ):
+        self._ssh_multi_port_forward = SSHMultiPortForward(
+            ssh_client=ssh_client,
+            specs=specs,
+            instrument=instrument,
+            stats_interval=stats_interval,
+            stats_path=stats_path,
+        )
+
+    def __enter__(self):
+        self._ssh_multi_port_forward.open()
+
+        return self._ssh_multi_port_forward
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._ssh_multi_port_forward.close()
+
+
+class SSHPortForward:
+    """
+    Forward a port through an ssh client.
+    """
+
+    _ssh_multi_port_forward: SSHMultiPortForward
+    _local_port: Optional[int]
+
+    def __init__(
+        self,
+        *,
+        ssh_client: SSHClient,
+        remote_host: str,
+        remote_port: int,
+        local_port: int = 0,
+        instrument: bool = False,
+        stats_interval: float = None,
+        stats_path: Union[Path, str] = None,
+    ):
+        self._ssh_multi_port_forward = SSHMultiPortForward(
+            ssh_client=ssh_client,
+            specs=[
+                SSHPortForwardSpec(
+                    remote_host=remote_host,
+                    remote_port=remote_port,
+                    local_port=local_port,
+                ),
+            ],
+            instrument=instrument,
+            stats_interval=stats_interval,
+            stats_path=stats_path,
+        )
+        self._local_port = None
+
+    def serve_forever(self):
+        """
+        Forward incoming requests until closed.
+        """
+        self._ssh_multi_port_forward.serve_forever()
+
+    def open(self):
+        """
+        Start the port forwarding server.
+        """
+        self._ssh_multi_port_forward.open()
+        self._local_port = self._ssh_multi_port_forward.local_ports[0]
+
+    def close(self):
+        """
+        Stop the port forwarding server.
+        """
+        self._ssh_multi_port_forward.close()
 
     @property
     def local_port(self) -> int:
-        # Obtain the port from the server,
+        # Obtain the port from the server socket,
         # so that providing local port of 0 allows automatically choosing an open port
-        (server_host, server_port) = self._server.server_address
-
-        return server_port
+        return self._local_port
 
     @property
     def remote_host(self) -> str:
-        return self._remote_host
+        return self._ssh_multi_port_forward.specs[0].remote_host
 
     @property
     def remote_port(self) -> int:
-        return self._remote_port
+        return self._ssh_multi_port_forward.specs[0].remote_port
+
+    @property
+    def counters(self) -> SSHPortForwardCounters:
+        return self._ssh_multi_port_forward.counters[0]
+
+    def stats(self) -> Dict:
+        """
+        Counters of the forward, including timings if instrumented.
+        """
+        return self._ssh_multi_port_forward.stats()
 
 
 class SSHPortForwardContextManager:
@@ -330,12 +2028,18 @@ class SSHPortForwardContextManager:
         remote_host: str,
         remote_port: int,
         local_port: int = 0,
+        instrument: bool = False,
+        stats_interval: float = None,
+        stats_path: Union[Path, str] = None,
     ):
         self._ssh_port_forward = SSHPortForward(
             ssh_client=ssh_client,
             remote_host=remote_host,
             remote_port=remote_port,
             local_port=local_port,
+            instrument=instrument,
+            stats_interval=stats_interval,
+            stats_path=stats_path,
         )
 
     def __enter__(self):
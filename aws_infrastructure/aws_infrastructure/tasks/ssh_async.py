@@ -0,0 +1,270 @@
+"""
+Asyncio interface to SSH, taking the same SSHConfig as `aws_infrastructure.tasks.ssh`.
+
+Blocking Paramiko operations run in a shared, bounded thread pool rather than a thread per channel,
+so many instances can be orchestrated from one event loop.
+Port forwards are served by the existing single-threaded forwarding engine.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+from pathlib import Path
+from pathlib import PurePosixPath
+import threading
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TypeVar
+from typing import Union
+
+import aws_infrastructure.tasks.ssh
+
+_T = TypeVar('_T')
+
+# Shared by every client which is not given its own executor
+_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_EXECUTOR_MAX_WORKERS = 32
+
+
+def _default_executor() -> concurrent.futures.ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_EXECUTOR_MAX_WORKERS,
+                thread_name_prefix='ssh_async',
+            )
+
+        return _executor
+
+
+class AsyncSSHClient:
+    """
+    Asyncio client for executing commands, uploading files, and forwarding ports.
+    """
+
+    _ssh_config: aws_infrastructure.tasks.ssh.SSHConfig
+    _pooled: bool
+    _executor: concurrent.futures.Executor
+
+    _ssh_client: Optional[aws_infrastructure.tasks.ssh.SSHClient]
+
+    def __init__(
+        self,
+        *,
+        ssh_config: aws_infrastructure.tasks.ssh.SSHConfig,
+        pooled: bool = True,
+        executor: concurrent.futures.Executor = None,
+    ):
+        self._ssh_config = ssh_config
+        self._pooled = pooled
+        self._executor = executor or _default_executor()
+
+        self._ssh_client = None
+
+    async def _run(self, function: Callable[..., _T], **kwargs) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(function, **kwargs),
+        )
+
+    async def open(self):
+        """
+        Connect the client.
+        """
+        ssh_client = aws_infrastructure.tasks.ssh.SSHClient(ssh_config=self._ssh_config, pooled=self._pooled)
+        await self._run(ssh_client.open)
+
+        self._ssh_client = ssh_client
+
+    async def close(self):
+        """
+        Close the client.
+        """
+        await self._run(self._ssh_client.close)
+
+        self._ssh_client = None
+
+    async def __aenter__(self) -> 'AsyncSSHClient':
+        await self.open()
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def ssh_client(self) -> aws_infrastructure.tasks.ssh.SSHClient:
+        return self._ssh_client
+
+    async def exec(
+        self,
+        *,
+        command: Union[str, List[str]],
+        timeout: float = None,
+        check: bool = False,
+        on_stdout: Callable[[str], None] = None,
+        on_stderr: Callable[[str], None] = None,
+    ) -> aws_infrastructure.tasks.ssh.SSHCommandResult:
+        """
+        Execute a command, capturing its output.
+
+        Any line callbacks are invoked on the event loop.
+        If the awaiting task is cancelled, the remote command is also cancelled.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        def on_loop(callback: Optional[Callable[[str], None]]) -> Optional[Callable[[str], None]]:
+            if callback is None:
+                return None
+            return lambda line: loop.call_soon_threadsafe(callback, line)
+
+        cancel = threading.Event()
+        try:
+            return await self._run(
+                self._ssh_client.exec_command,
+                command=command,
+                echo=False,
+                timeout=timeout,
+                cancel=cancel,
+                check=check,
+                on_stdout=on_loop(on_stdout),
+                on_stderr=on_loop(on_stderr),
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    async def put(
+        self,
+        *,
+        local_path: Union[Path, str],
+        remote_path: Union[PurePosixPath, str],
+    ) -> int:
+        """
+        Upload a file, returning the number of bytes sent.
+
+        The remote directory must already exist.
+        """
+
+        def put():
+            with aws_infrastructure.tasks.ssh.SFTPClientContextManager(ssh_client=self._ssh_client) as sftp_client:
+                return aws_infrastructure.tasks.ssh._sftp_upload(
+                    paramiko_sftp_client=sftp_client.paramiko_sftp_client,
+                    local_path=Path(local_path),
+                    remote_path=PurePosixPath(remote_path).as_posix(),
+                )
+
+        return await self._run(put)
+
+    async def sync(
+        self,
+        *,
+        remote_dir: Union[PurePosixPath, str],
+        files: Dict[str, Union[Path, str]],
+        max_workers: int = 4,
+        prune: bool = False,
+    ) -> aws_infrastructure.tasks.ssh.SFTPSyncResult:
+        """
+        Upload files to a remote directory, skipping any which already match.
+
+        If prune, any other remote file in the directory is removed.
+        """
+
+        return await self._run(
+            aws_infrastructure.tasks.ssh.sftp_sync,
+            ssh_client=self._ssh_client,
+            remote_dir=remote_dir,
+            files=files,
+            max_workers=max_workers,
+            prune=prune,
+        )
+
+    def forward(
+        self,
+        *,
+        specs: List[aws_infrastructure.tasks.ssh.SSHPortForwardSpec],
+        instrument: bool = False,
+        stats_interval: float = None,
+        stats_path: Union[Path, str] = None,
+    ) -> 'AsyncSSHPortForward':
+        """
+        Forward ports through this client, for use as an async context manager.
+        """
+
+        return AsyncSSHPortForward(
+            client=self,
+            port_forward=aws_infrastructure.tasks.ssh.SSHMultiPortForward(
+                ssh_client=self._ssh_client,
+                specs=specs,
+                instrument=instrument,
+                stats_interval=stats_interval,
+                stats_path=stats_path,
+            ),
+        )
+
+
+class AsyncSSHPortForward:
+    """
+    Asyncio context manager for a forward of many ports.
+    """
+
+    _client: AsyncSSHClient
+    _port_forward: aws_infrastructure.tasks.ssh.SSHMultiPortForward
+
+    def __init__(
+        self,
+        *,
+        client: AsyncSSHClient,
+        port_forward: aws_infrastructure.tasks.ssh.SSHMultiPortForward,
+    ):
+        self._client = client
+        self._port_forward = port_forward
+
+    async def __aenter__(self) -> aws_infrastructure.tasks.ssh.SSHMultiPortForward:
+        # Opening binds and listens, which does not block
+        self._port_forward.open()
+
+        return self._port_forward
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # Closing waits for the forwarding thread to finish
+        await self._client._run(self._port_forward.close)
+
+
+async def gather_clients(
+    *,
+    ssh_configs: Dict[str, aws_infrastructure.tasks.ssh.SSHConfig],
+    operation: Callable[[str, AsyncSSHClient], Awaitable[_T]],
+    limit: int = 8,
+) -> Dict[str, Union[_T, Exception]]:
+    """
+    Apply an operation to a client for each instance concurrently, at most limit at a time.
+
+    Returns the result for each instance, keyed by the same names,
+    or the exception for any instance that could not be connected to or whose operation failed.
+    """
+
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def operation_current(name_current: str, ssh_config_current: aws_infrastructure.tasks.ssh.SSHConfig):
+        async with semaphore:
+            async with AsyncSSHClient(ssh_config=ssh_config_current) as client:
+                return await operation(name_current, client)
+
+    names = list(ssh_configs.keys())
+    results = await asyncio.gather(
+        *[
+            operation_current(name_current, ssh_configs[name_current])
+            for name_current in names
+        ],
+        return_exceptions=True,
+    )
+
+    return dict(zip(names, results))
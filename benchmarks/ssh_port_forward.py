@@ -0,0 +1,242 @@
+"""
+Benchmark of SSH port forwarding against a local stand-in for an SSH server.
+
+Measures throughput in each direction, aggregate throughput of parallel connections,
+and the latency of establishing a forwarded connection.
+
+Run from the root of the repository:
+
+    python benchmarks/ssh_port_forward.py
+"""
+
+import argparse
+import io
+import os
+import paramiko
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'aws_infrastructure'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aws_infrastructure.tasks.ssh
+import sshd_stand_in
+
+_CHUNK = b'\0' * (256 * 1024)
+
+
+def _start_target() -> int:
+    """
+    Start a local target service, returning its port.
+
+    The first byte received selects a behavior:
+    'u' receives until end of file and then replies with the number of bytes received,
+    'd' sends the number of bytes requested and then closes,
+    'e' echoes until end of file.
+    """
+
+    def serve(sock: socket.socket):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        mode = sock.recv(1)
+        if mode == b'u':
+            received = 0
+            while True:
+                data = sock.recv(256 * 1024)
+                if not data:
+                    break
+                received += len(data)
+            sock.sendall(str(received).encode('ascii'))
+        elif mode == b'd':
+            requested = int(sock.recv(64).decode('ascii'))
+            while requested > 0:
+                sent = sock.send(_CHUNK[:min(len(_CHUNK), requested)])
+                requested -= sent
+        elif mode == b'e':
+            while True:
+                data = sock.recv(256 * 1024)
+                if not data:
+                    break
+                sock.sendall(data)
+
+        sock.close()
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(socket.SOMAXCONN)
+
+    def accept_forever():
+        while True:
+            sock, _ = server_socket.accept()
+            threading.Thread(target=serve, args=(sock,), daemon=True).start()
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+
+    return server_socket.getsockname()[1]
+
+
+def _connect(local_port: int) -> socket.socket:
+    sock = socket.create_connection(('127.0.0.1', local_port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    return sock
+
+
+def _upload(local_port: int, size: int) -> float:
+    """
+    Upload size bytes, returning the elapsed seconds.
+    """
+
+    time_start = time.perf_counter()
+
+    sock = _connect(local_port)
+    sock.sendall(b'u')
+    remaining = size
+    while remaining > 0:
+        remaining -= sock.send(_CHUNK[:min(len(_CHUNK), remaining)])
+    sock.shutdown(socket.SHUT_WR)
+
+    # Half-closed, the reply must still arrive
+    reply = b''
+    while True:
+        data = sock.recv(64)
+        if not data:
+            break
+        reply += data
+    sock.close()
+
+    if int(reply.decode('ascii')) != size:
+        raise RuntimeError('Target received {} of {} bytes'.format(reply.decode('ascii'), size))
+
+    return time.perf_counter() - time_start
+
+
+def _download(local_port: int, size: int) -> float:
+    """
+    Download size bytes, returning the elapsed seconds.
+    """
+
+    time_start = time.perf_counter()
+
+    sock = _connect(local_port)
+    sock.sendall(b'd' + str(size).encode('ascii'))
+    received = 0
+    while True:
+        data = sock.recv(256 * 1024)
+        if not data:
+            break
+        received += len(data)
+    sock.close()
+
+    if received != size:
+        raise RuntimeError('Received {} of {} bytes'.format(received, size))
+
+    return time.perf_counter() - time_start
+
+
+def _setup_latency(local_port: int) -> float:
+    """
+    Time to connect and complete a one byte round trip, in seconds.
+    """
+
+    time_start = time.perf_counter()
+
+    sock = _connect(local_port)
+    sock.sendall(b'ex')
+    sock.recv(1)
+    elapsed = time.perf_counter() - time_start
+
+    sock.shutdown(socket.SHUT_WR)
+    while sock.recv(64):
+        pass
+    sock.close()
+
+    return elapsed
+
+
+def _parallel(local_port: int, size: int, count: int) -> float:
+    """
+    Upload size bytes on each of count connections at once, returning the elapsed seconds.
+    """
+
+    errors = []
+
+    def upload_current():
+        try:
+            _upload(local_port, size)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=upload_current) for _ in range(count)]
+
+    time_start = time.perf_counter()
+    for thread_current in threads:
+        thread_current.start()
+    for thread_current in threads:
+        thread_current.join()
+    elapsed = time.perf_counter() - time_start
+
+    if errors:
+        raise errors[0]
+
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megabytes', type=int, default=64, help='size of each throughput transfer')
+    parser.add_argument('--parallel', type=int, default=8, help='number of parallel connections')
+    parser.add_argument('--connections', type=int, default=100, help='number of connections for setup latency')
+    args = parser.parse_args()
+
+    size = args.megabytes * 1024 * 1024
+
+    key = io.StringIO()
+    paramiko.RSAKey.generate(2048).write_private_key(key)
+
+    ssh_config = aws_infrastructure.tasks.ssh.SSHConfig(
+        ip='127.0.0.1',
+        port=sshd_stand_in.start(),
+        user='benchmark',
+        key=key.getvalue(),
+        key_file='benchmark',
+    )
+    target_port = _start_target()
+
+    with aws_infrastructure.tasks.ssh.SSHClientContextManager(ssh_config=ssh_config) as ssh_client:
+        with aws_infrastructure.tasks.ssh.SSHPortForwardContextManager(
+            ssh_client=ssh_client,
+            remote_host='127.0.0.1',
+            remote_port=target_port,
+        ) as port_forward:
+            local_port = port_forward.local_port
+
+            elapsed = _upload(local_port, size)
+            print('Upload:   {:8.1f} MB/s ({} MiB in {:.2f}s)'.format(size / elapsed / 1e6, args.megabytes, elapsed))
+
+            elapsed = _download(local_port, size)
+            print('Download: {:8.1f} MB/s ({} MiB in {:.2f}s)'.format(size / elapsed / 1e6, args.megabytes, elapsed))
+
+            size_parallel = max(1, size // args.parallel)
+            elapsed = _parallel(local_port, size_parallel, args.parallel)
+            print('Parallel: {:8.1f} MB/s ({} connections of {:.1f} MiB in {:.2f}s)'.format(
+                size_parallel * args.parallel / elapsed / 1e6,
+                args.parallel,
+                size_parallel / (1024 * 1024),
+                elapsed,
+            ))
+
+            latencies = sorted(_setup_latency(local_port) for _ in range(args.connections))
+            print('Setup:    {:8.2f} ms median, {:.2f} ms p95, {:.2f} ms max ({} connections)'.format(
+                statistics.median(latencies) * 1000,
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+                latencies[-1] * 1000,
+                args.connections,
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Local stand-in for an SSH server, for benchmarking without an instance.
+
+Accepts any public key and supports direct-tcpip channels (i.e., port forwarding).
+Built on Paramiko's server support, so its own overhead is included in any measurement.
+"""
+
+import paramiko
+import select
+import socket
+import threading
+from typing import Tuple
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self):
+        self.destinations = {}
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        self.destinations[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+
+def _forward(channel: paramiko.Channel, destination: Tuple[str, int]):
+    """
+    Forward a channel to its destination, forwarding end of file separately in each direction.
+    """
+
+    sock = socket.create_connection(destination)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    open_sources = [sock, channel]
+    while open_sources:
+        ready, _, _ = select.select(open_sources, [], [])
+        if sock in ready:
+            data = sock.recv(64 * 1024)
+            if data:
+                channel.sendall(data)
+            else:
+                channel.shutdown_write()
+                open_sources.remove(sock)
+        if channel in ready:
+            data = channel.recv(64 * 1024)
+            if data:
+                sock.sendall(data)
+            else:
+                sock.shutdown(socket.SHUT_WR)
+                open_sources.remove(channel)
+
+    sock.close()
+    channel.close()
+
+
+def _serve_connection(client: socket.socket, host_key: paramiko.PKey):
+    transport = paramiko.Transport(client)
+    transport.add_server_key(host_key)
+
+    server_interface = _ServerInterface()
+    transport.start_server(server=server_interface)
+
+    while transport.is_active():
+        channel = transport.accept(timeout=1)
+        if channel is None:
+            continue
+
+        destination = server_interface.destinations.pop(channel.get_id(), None)
+        if destination is None:
+            channel.close()
+            continue
+
+        threading.Thread(target=_forward, args=(channel, destination), daemon=True).start()
+
+
+def start() -> int:
+    """
+    Start the stand-in on an available local port, returning the port.
+    """
+
+    host_key = paramiko.RSAKey.generate(2048)
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(socket.SOMAXCONN)
+
+    def accept_forever():
+        while True:
+            client, _ = server_socket.accept()
+            threading.Thread(target=_serve_connection, args=(client, host_key), daemon=True).start()
+
+    threading.Thread(target=accept_forever, daemon=True).start()
+
+    return server_socket.getsockname()[1]
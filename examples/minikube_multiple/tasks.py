@@ -23,6 +23,8 @@ ns_minikube = aws_infrastructure.tasks.library.minikube.create_tasks(
     staging_remote_helm_dir=STAGING_REMOTE_HELM_DIR,
     staging_remote_helmfile_dir=STAGING_REMOTE_HELMFILE_DIR,
     instance_names=INSTANCE_NAMES,
+    targeted_tasks=True,
+    state_report=True,
 )
 
 compose_collection(
@@ -36,6 +38,7 @@ compose_collection(
         ],
         exclude_without_state=[
             'destroy',
+            'state-report',
         ],
     )
 )